@@ -7,7 +7,7 @@ import os
 import logging
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone, timedelta
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
 from sqlalchemy.orm import Session
 from dataclasses import dataclass, asdict
 from enum import Enum
@@ -108,61 +108,60 @@ class AnalyticsEngine:
                                start_date: Optional[datetime] = None,
                                end_date: Optional[datetime] = None) -> ConversationMetrics:
         """Get conversation performance metrics"""
+        db = self.db_manager.SessionLocal()
         try:
-            db = next(self.db_manager.get_db())
             period_start, period_end = self.get_period_dates(period, start_date, end_date)
             
-            # Base query for sessions in period
-            session_query = db.query(ConversationSession).filter(
-                ConversationSession.created_at >= period_start,
-                ConversationSession.created_at <= period_end
+            # Every count comes back in one round trip: each table is aggregated once with
+            # FILTER clauses, and the single-row aggregates are selected side by side
+            session_stats = (
+                select(
+                    func.count().label('total_sessions'),
+                    func.count().filter(ConversationSession.is_active == True).label('active_sessions'),
+                    func.count().filter(ConversationSession.ended_at.isnot(None)).label('completed_sessions'),
+                    func.count().filter(ConversationSession.current_state == "staff_handoff_requested").label('staff_handoffs'),
+                    # NULL for sessions that haven't ended, which avg() skips
+                    func.avg(func.extract('epoch', ConversationSession.ended_at - ConversationSession.created_at)).label('average_session_duration'),
+                )
+                .where(ConversationSession.created_at >= period_start, ConversationSession.created_at <= period_end)
+                .subquery()
+            )
+            message_stats = (
+                select(
+                    func.count().label('total_messages'),
+                    func.count().filter(ConversationMessage.role == "user").label('user_messages'),
+                    func.count().filter(ConversationMessage.role == "assistant").label('assistant_messages'),
+                )
+                .where(ConversationMessage.created_at >= period_start, ConversationMessage.created_at <= period_end)
+                .subquery()
+            )
+            recommendation_count = (
+                select(func.count())
+                .select_from(ProductRecommendation)
+                .where(ProductRecommendation.created_at >= period_start, ProductRecommendation.created_at <= period_end)
+                .scalar_subquery()
             )
+            stats = db.execute(select(session_stats, message_stats, recommendation_count.label('products_recommended'))).one()
             
             # Session metrics
-            total_sessions = session_query.count()
-            active_sessions = session_query.filter(ConversationSession.is_active == True).count()
-            completed_sessions = session_query.filter(ConversationSession.ended_at.isnot(None)).count()
-            
-            # Session duration
-            completed_sessions_data = session_query.filter(
-                ConversationSession.ended_at.isnot(None)
-            ).all()
-            
-            if completed_sessions_data:
-                durations = [
-                    (session.ended_at - session.created_at).total_seconds()
-                    for session in completed_sessions_data
-                ]
-                average_session_duration = sum(durations) / len(durations)
-            else:
-                average_session_duration = 0
+            total_sessions = stats.total_sessions
+            active_sessions = stats.active_sessions
+            completed_sessions = stats.completed_sessions
+            average_session_duration = float(stats.average_session_duration or 0)
             
             # Message metrics
-            message_query = db.query(ConversationMessage).filter(
-                ConversationMessage.created_at >= period_start,
-                ConversationMessage.created_at <= period_end
-            )
-            
-            total_messages = message_query.count()
-            user_messages = message_query.filter(ConversationMessage.role == "user").count()
-            assistant_messages = message_query.filter(ConversationMessage.role == "assistant").count()
+            total_messages = stats.total_messages
+            user_messages = stats.user_messages
+            assistant_messages = stats.assistant_messages
             
             average_messages_per_session = total_messages / total_sessions if total_sessions > 0 else 0
             
             # Recommendation metrics
-            recommendation_query = db.query(ProductRecommendation).filter(
-                ProductRecommendation.created_at >= period_start,
-                ProductRecommendation.created_at <= period_end
-            )
-            
-            products_recommended = recommendation_query.count()
+            products_recommended = stats.products_recommended
             average_recommendations_per_session = products_recommended / total_sessions if total_sessions > 0 else 0
             
             # Staff handoff metrics
-            staff_handoff_sessions = session_query.filter(
-                ConversationSession.current_state == "staff_handoff_requested"
-            ).count()
-            
+            staff_handoff_sessions = stats.staff_handoffs
             handoff_rate = staff_handoff_sessions / total_sessions if total_sessions > 0 else 0
             
             return ConversationMetrics(
@@ -194,13 +193,15 @@ class AnalyticsEngine:
                 handoff_rate=0, period=period.value,
                 start_date=period_start, end_date=period_end
             )
+        finally:
+            db.close()
     
     def get_product_metrics(self, period: MetricPeriod = MetricPeriod.LAST_DAY,
                           start_date: Optional[datetime] = None,
                           end_date: Optional[datetime] = None) -> ProductMetrics:
         """Get product recommendation metrics"""
+        db = self.db_manager.SessionLocal()
         try:
-            db = next(self.db_manager.get_db())
             period_start, period_end = self.get_period_dates(period, start_date, end_date)
             
             # Base query for recommendations in period
@@ -344,13 +345,15 @@ class AnalyticsEngine:
                 category_breakdown={}, price_range_breakdown={},
                 period=period.value, start_date=period_start, end_date=period_end
             )
+        finally:
+            db.close()
     
     def get_user_behavior_metrics(self, period: MetricPeriod = MetricPeriod.LAST_DAY,
                                 start_date: Optional[datetime] = None,
                                 end_date: Optional[datetime] = None) -> UserBehaviorMetrics:
         """Get user behavior and engagement metrics"""
+        db = self.db_manager.SessionLocal()
         try:
-            db = next(self.db_manager.get_db())
             period_start, period_end = self.get_period_dates(period, start_date, end_date)
             
             # Base metrics
@@ -359,7 +362,7 @@ class AnalyticsEngine:
                 ConversationSession.created_at <= period_end
             ).count()
             
-            # Session lengths
+            # Session lengths, aggregated in the database so only one row comes back
             sessions_with_messages = (
                 db.query(
                     ConversationSession.id,
@@ -373,22 +376,17 @@ class AnalyticsEngine:
                     ConversationSession.created_at <= period_end
                 )
                 .group_by(ConversationSession.id)
-                .all()
+                .subquery()
             )
-            
-            if sessions_with_messages:
-                session_lengths = [
-                    (session.last_message - session.first_message).total_seconds()
-                    for session in sessions_with_messages
-                ]
-                average_session_length = sum(session_lengths) / len(session_lengths)
-                
+            sessions_with_message_count, average_session_length, single_message_sessions = db.query(
+                func.count(),
+                func.avg(func.extract('epoch', sessions_with_messages.c.last_message - sessions_with_messages.c.first_message)),
                 # Bounce rate (sessions with only 1 message)
-                single_message_sessions = sum(1 for session in sessions_with_messages if session.message_count <= 1)
-                bounce_rate = single_message_sessions / len(sessions_with_messages) if sessions_with_messages else 0
-            else:
-                average_session_length = 0
-                bounce_rate = 0
+                func.count().filter(sessions_with_messages.c.message_count <= 1),
+            ).one()
+            
+            average_session_length = float(average_session_length or 0)
+            bounce_rate = single_message_sessions / sessions_with_message_count if sessions_with_message_count else 0
             
             # Engagement score (average messages per session)
             total_messages = db.query(ConversationMessage).filter(
@@ -483,6 +481,8 @@ class AnalyticsEngine:
                 conversion_funnel={}, peak_hours=[0] * 24,
                 period=period.value, start_date=period_start, end_date=period_end
             )
+        finally:
+            db.close()
     
     def get_comprehensive_dashboard_data(self, period: MetricPeriod = MetricPeriod.LAST_DAY) -> Dict[str, Any]:
         """Get comprehensive dashboard data"""
@@ -515,9 +515,8 @@ class AnalyticsEngine:
     
     def get_session_details(self, session_id: str) -> Dict[str, Any]:
         """Get detailed session information"""
+        db = self.db_manager.SessionLocal()
         try:
-            db = next(self.db_manager.get_db())
-            
             # Get session
             session = db.query(ConversationSession).filter(
                 ConversationSession.id == session_id
@@ -598,6 +597,8 @@ class AnalyticsEngine:
         except Exception as e:
             logger.error(f"Error getting session details: {e}")
             return {"error": str(e)}
+        finally:
+            db.close()
 
 # Global analytics engine instance
 analytics_engine = None
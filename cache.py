@@ -4,8 +4,13 @@ Handles session storage and conversation history with Redis persistence
 """
 
 import redis
-import json
+import redis.asyncio as redis_asyncio
+from cachetools import TTLCache
+import orjson
 import os
+import zlib
+import hashlib
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
@@ -77,7 +82,7 @@ class RedisClient:
         
         try:
             key = self.get_session_key(session_id)
-            serialized_data = json.dumps(session_data)
+            serialized_data = orjson.dumps(session_data)
             
             # Set with TTL
             result = self.client.setex(key, ttl, serialized_data)
@@ -112,7 +117,7 @@ class RedisClient:
             data = self.client.get(key)
             
             if data:
-                session_data = json.loads(data)
+                session_data = orjson.loads(data)
                 logger.debug(f"Session {session_id} retrieved successfully")
                 return session_data
             else:
@@ -190,7 +195,7 @@ class RedisClient:
             }
             
             # Add to Redis list (RPUSH adds to end)
-            self.client.rpush(key, json.dumps(message))
+            self.client.rpush(key, orjson.dumps(message))
             
             # Set TTL for history (longer than session)
             self.client.expire(key, 7200)  # 2 hours
@@ -227,9 +232,9 @@ class RedisClient:
             parsed_messages = []
             for msg_str in messages:
                 try:
-                    msg = json.loads(msg_str)
+                    msg = orjson.loads(msg_str)
                     parsed_messages.append(msg)
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     logger.warning(f"Failed to parse message: {msg_str}")
             
             logger.debug(f"Retrieved {len(parsed_messages)} messages for session {session_id}")
@@ -298,6 +303,227 @@ def is_redis_available() -> bool:
     client = get_redis_client()
     return client.is_connected()
 
+# Number of lock shards serializing read-modify-write cycles on the same session
+SESSION_LOCK_SHARDS = 16
+
+# Upper bound on sessions kept by the in-process fallback; least recently used are evicted first
+LOCAL_SESSION_MAXSIZE = int(os.getenv("LOCAL_SESSION_MAXSIZE", "50000"))
+
+# Idle lifetime of a session, in Redis and in the fallback alike; each turn renews it
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+class AsyncRedisClient:
+    """Async Redis client for session reads/writes on the request path"""
+    
+    def __init__(self, redis_url: Optional[str] = None, session_ttl: int = 3600, recommendation_ttl: int = 600):
+        """
+        Initialize async Redis client (call connect() from the event loop)
+        
+        Args:
+            redis_url: Redis connection URL
+            session_ttl: Session time to live in seconds (default: 1 hour)
+            recommendation_ttl: Cached recommendation time to live in seconds (default: 10 minutes)
+        """
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379")
+        self.session_ttl = session_ttl
+        self.recommendation_ttl = recommendation_ttl
+        self.client = None
+        self.connected = False
+        # In-process fallback so a single worker keeps serving sessions without Redis;
+        # stored encoded like in Redis so callers never share a live dict, and bounded and
+        # expired like Redis so abandoned sessions don't accumulate
+        self._local_sessions: TTLCache = TTLCache(maxsize=LOCAL_SESSION_MAXSIZE, ttl=session_ttl)
+        self._session_locks = [asyncio.Lock() for _ in range(SESSION_LOCK_SHARDS)]
+    
+    async def connect(self) -> bool:
+        """
+        Connect to Redis and verify the connection
+        
+        Returns:
+            True if connected, False if falling back to in-process storage
+        """
+        try:
+            self.client = redis_asyncio.from_url(
+                self.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True
+            )
+            await self.client.ping()
+            self.connected = True
+            logger.info(f"Async Redis connected successfully at {self.redis_url}")
+            
+        except Exception as e:
+            logger.error(f"Async Redis connection failed, using in-process session storage: {e}")
+            self.connected = False
+            self.client = None
+        
+        return self.connected
+    
+    async def close(self):
+        """Close the Redis connection pool"""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.connected = False
+    
+    def is_connected(self) -> bool:
+        """Check if Redis is connected"""
+        return self.connected and self.client is not None
+    
+    def get_session_key(self, session_id: str) -> str:
+        """Get Redis key for session data"""
+        return f"session:{session_id}"
+    
+    def get_history_key(self, session_id: str) -> str:
+        """Get Redis key for conversation history"""
+        return f"history:{session_id}"
+    
+    def get_recommendation_key(self, catalog_version: str, attributes: Dict[str, Any]) -> str:
+        """Get Redis key for recommendations, an MD5 of the sorted attributes under the catalog version"""
+        digest = hashlib.md5(orjson.dumps(attributes, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return f"rec:exact:{catalog_version}:{digest}"
+    
+    def session_lock(self, session_id: str) -> asyncio.Lock:
+        """
+        Get the lock shard guarding a session's get/set cycle in this process
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            asyncio.Lock shared by all sessions hashing to the same shard
+        """
+        return self._session_locks[zlib.crc32(session_id.encode()) % SESSION_LOCK_SHARDS]
+    
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve session data
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            Session data dictionary or None if not found
+        """
+        if not self.is_connected():
+            data = self._local_sessions.get(session_id)
+            return orjson.loads(data) if data else None
+        
+        try:
+            data = await self.client.get(self.get_session_key(session_id))
+            return orjson.loads(data) if data else None
+            
+        except Exception as e:
+            logger.error(f"Error getting session {session_id}: {e}")
+            return None
+    
+    async def set_session(self, session_id: str, session_data: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """
+        Store session data with a TTL
+        
+        Args:
+            session_id: Session identifier
+            session_data: Session data dictionary
+            ttl: Time to live in seconds (default: session_ttl)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.is_connected():
+            self._local_sessions[session_id] = orjson.dumps(session_data)
+            return True
+        
+        try:
+            await self.client.setex(self.get_session_key(session_id), ttl or self.session_ttl, orjson.dumps(session_data))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error setting session {session_id}: {e}")
+            return False
+    
+    async def delete_session(self, session_id: str) -> bool:
+        """
+        Delete session data and its conversation history
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            True if a session was deleted, False otherwise
+        """
+        if not self.is_connected():
+            return self._local_sessions.pop(session_id, None) is not None
+        
+        try:
+            result = await self.client.delete(self.get_session_key(session_id), self.get_history_key(session_id))
+            return result > 0
+            
+        except Exception as e:
+            logger.error(f"Error deleting session {session_id}: {e}")
+            return False
+
+    async def get_recommendations(self, catalog_version: str, attributes: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieve cached recommendations for an exact attribute set
+        
+        Args:
+            catalog_version: Version of the catalog the recommendations come from
+            attributes: Attributes the recommendations were computed from
+            
+        Returns:
+            Cached product list or None on a miss (always None without Redis)
+        """
+        if not self.is_connected():
+            return None
+        
+        try:
+            data = await self.client.get(self.get_recommendation_key(catalog_version, attributes))
+            return orjson.loads(data) if data else None
+            
+        except Exception as e:
+            logger.error(f"Error getting cached recommendations: {e}")
+            return None
+    
+    async def set_recommendations(self, catalog_version: str, attributes: Dict[str, Any], products: List[Dict[str, Any]]) -> bool:
+        """
+        Cache recommendations for an exact attribute set
+        
+        Args:
+            catalog_version: Version of the catalog the recommendations come from
+            attributes: Attributes the recommendations were computed from
+            products: Recommended product dictionaries
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.is_connected():
+            return False
+        
+        try:
+            await self.client.setex(self.get_recommendation_key(catalog_version, attributes), self.recommendation_ttl, orjson.dumps(products))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error caching recommendations: {e}")
+            return False
+
+# Global async Redis client instance
+async_redis_client = None
+
+def get_async_redis_client() -> AsyncRedisClient:
+    """
+    Get or create global async Redis client instance
+    
+    Returns:
+        AsyncRedisClient instance
+    """
+    global async_redis_client
+    if async_redis_client is None:
+        async_redis_client = AsyncRedisClient(session_ttl=SESSION_TTL_SECONDS)
+    return async_redis_client
+
 if __name__ == "__main__":
     # Test Redis connection
     print("Testing Redis connection...")
@@ -0,0 +1,311 @@
+"""
+Product Catalog Index
+Columnar (struct-of-arrays) views over the product catalog for vectorized filtering
+"""
+import re
+import random
+import hashlib
+import logging
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+from datetime import datetime
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Text attributes that can be filtered on; each is dictionary-encoded into an int column
+FILTER_FIELDS = ('category', 'metal', 'style', 'gemstone')
+
+# Weights used by match scoring; equality on the coded fields, tag matching on the tag lists
+MATCH_FIELD_WEIGHTS = (('category', 0.3), ('metal', 0.25), ('style', 0.2), ('gemstone', 0.15))
+# (attribute, product tag list it is matched against, weight)
+MATCH_TAG_WEIGHTS = (('occasion', 'occasion_tags', 0.05), ('recipient', 'recipient_tags', 0.05))
+
+# Attribute -> the tag list its values are looked up in
+ATTRIBUTE_TAG_FIELDS = {attribute: tag_field for attribute, tag_field, _ in MATCH_TAG_WEIGHTS}
+
+# Tags are also indexed by word, so single-word occasions/recipients match by set membership
+TAG_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def tag_tokens(tags) -> frozenset:
+    """Lowercased words of a product's tags, e.g. ('Wedding-Anniversary',) -> {'wedding', 'anniversary'}"""
+    return frozenset(token for tag in tags for token in TAG_TOKEN_RE.findall(tag.lower()))
+
+# Number of products kept in the pre-sampled pool used for browsing suggestions
+FEATURED_POOL_SIZE = 48
+
+# Price bands per category; the featured pool draws from each band in turn
+FEATURED_PRICE_BANDS = 4
+
+# Seconds between background reshuffles of the featured pool
+FEATURED_REFRESH_SECONDS = 60
+
+class CatalogProduct(NamedTuple):
+    """Immutable, dict-free catalog row; CatalogIndex.records holds the matching response dicts"""
+    id: str
+    name: str
+    category: str
+    image_url: Optional[str]
+    price: float
+    metal: Optional[str]
+    gemstones: Tuple[str, ...]
+    design_type: Optional[str]
+    style_tags: Tuple[str, ...]
+    occasion_tags: Tuple[str, ...]
+    recipient_tags: Tuple[str, ...]
+    tags: Tuple[str, ...]
+    description: Optional[str]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, row) -> 'CatalogProduct':
+        """Build a catalog row from a products table mapping (see DatabaseManager.get_all_product_rows)"""
+        return cls(
+            row['id'], row['name'], row['category'], row['image_url'], row['price'], row['metal'],
+            tuple(row['gemstones'] or ()), row['design_type'], tuple(row['style_tags'] or ()),
+            tuple(row['occasion_tags'] or ()), tuple(row['recipient_tags'] or ()), tuple(row['tags'] or ()),
+            row['description'], row['created_at'],
+        )
+
+def calculate_match_score(product: dict, attributes: dict) -> float:
+    """Calculate how well a product matches user attributes (0.0 to 1.0)
+    
+    Catalog products are scored by CatalogIndex.match_scores over precomputed lowercase columns;
+    this per-dict version only handles results that are not in the catalog, and is the reference
+    the vectorized scores are tested against.
+    """
+    score = 0.0
+    total_weight = 0.0
+    
+    # Category, metal, style and gemstone matching, in decreasing weight
+    for field, weight in MATCH_FIELD_WEIGHTS:
+        if attributes.get(field) and product.get(field):
+            if attributes[field].lower() == product[field].lower():
+                score += weight
+            total_weight += weight
+    
+    # Occasion and recipient matching (lower weight) against the product's occasion/recipient tags;
+    # single words match tag words, phrases match as substrings of a tag
+    for attribute, tag_field, weight in MATCH_TAG_WEIGHTS:
+        tags = product.get(tag_field)
+        if attributes.get(attribute) and tags:
+            wanted = attributes[attribute].lower()
+            words = TAG_TOKEN_RE.findall(wanted)
+            if (words[0] in tag_tokens(tags)) if len(words) == 1 else any(wanted in tag.lower() for tag in tags):
+                score += weight
+            total_weight += weight
+    
+    # Normalize score
+    if total_weight > 0:
+        return score / total_weight
+    return 0.0
+
+class TagColumn:
+    """One list-valued tag field: a products x distinct-tag matrix plus a word -> products index"""
+
+    def __init__(self, products: List[CatalogProduct], field: str):
+        # Distinct lowercased tags, so a substring test runs once per tag rather than per product
+        vocab: Dict[str, int] = {}
+        rows = [[vocab.setdefault(tag.lower(), len(vocab)) for tag in getattr(product, field)] for product in products]
+        self.vocab = list(vocab)
+        self.matrix = np.zeros((len(products), len(vocab)), dtype=bool)
+        for i, row in enumerate(rows):
+            self.matrix[i, row] = True
+        self.present = self.matrix.any(axis=1)
+        # word -> indices of products whose tags contain it
+        token_products: Dict[str, List[int]] = {}
+        for i, product in enumerate(products):
+            for token in tag_tokens(getattr(product, field)):
+                token_products.setdefault(token, []).append(i)
+        self.token_index = {token: np.asarray(rows, dtype=np.intp) for token, rows in token_products.items()}
+
+    def hits(self, indices: np.ndarray, wanted: str) -> np.ndarray:
+        """Which of the given products have a tag matching wanted"""
+        wanted = wanted.lower()
+        tokens = TAG_TOKEN_RE.findall(wanted)
+        if len(tokens) == 1:
+            # Single word: one dict lookup plus a membership test
+            return np.isin(indices, self.token_index.get(tokens[0], ()))
+        # Phrases keep substring matching, evaluated once per distinct tag
+        tag_hits = np.fromiter((wanted in tag for tag in self.vocab), dtype=bool, count=len(self.vocab))
+        return self.matrix[indices][:, tag_hits].any(axis=1)
+
+    def contains(self, wanted: str) -> bool:
+        """Whether any product has a tag matching wanted, by the same rule as hits"""
+        wanted = wanted.lower()
+        tokens = TAG_TOKEN_RE.findall(wanted)
+        if len(tokens) == 1:
+            return tokens[0] in self.token_index
+        return any(wanted in tag for tag in self.vocab)
+
+class CatalogIndex:
+    """Parallel NumPy arrays built once from the catalog's CatalogProduct rows"""
+
+    def __init__(self, products: List[CatalogProduct]):
+        self.products = products
+        self.size = len(products)
+        self.prices = np.fromiter((p.price or 0.0 for p in products), dtype=np.float64, count=self.size)
+        # Rank of each product's name in sorted order, so name tie-breaks sort as integers
+        self.name_ranks = np.empty(self.size, dtype=np.int32)
+        self.name_ranks[sorted(range(self.size), key=lambda i: products[i].name or '')] = np.arange(self.size, dtype=np.int32)
+        # field -> int32 codes into vocab[field]; code 0 is reserved for a missing value
+        self.codes: Dict[str, np.ndarray] = {}
+        self.vocab: Dict[str, List[str]] = {}
+        for field in FILTER_FIELDS:
+            self._encode_column(field)
+        self._build_tag_postings()
+        self.tag_columns = {field: TagColumn(products, field) for field in ATTRIBUTE_TAG_FIELDS.values()}
+        self.id_index = {product.id: i for i, product in enumerate(products)}
+        # Hash of the rows in catalog order: identical across workers and restarts while the data is
+        # unchanged, and any edit (a price, a new product, a reorder) changes it
+        digest = hashlib.blake2b(digest_size=8)
+        for product in products:
+            digest.update(repr(tuple(product)).encode())
+        self.version = digest.hexdigest()
+        # Response dicts built once per catalog load; shared read-only, so handlers must copy before annotating
+        self.records = [product._asdict() for product in products]
+        # Newest first for new-arrivals, with each id's position so a cursor seeks in O(1)
+        newest = sorted(range(self.size), key=lambda i: products[i].created_at or datetime.min, reverse=True)
+        self.newest_first = [products[i] for i in newest]
+        self.newest_rank = {products[i].id: rank for rank, i in enumerate(newest)}
+        self._build_category_buckets()
+        # lowercased storefront category -> member products, filled by index_categories
+        self.category_members: Dict[str, List[CatalogProduct]] = {}
+        self.refresh_featured()
+        logger.info(f"Catalog index built for {self.size} products")
+
+    def _encode_column(self, field: str):
+        vocab = {'': 0}
+        codes = np.empty(self.size, dtype=np.int32)
+        for i, product in enumerate(self.products):
+            value = (getattr(product, field, None) or '').lower()
+            codes[i] = vocab.setdefault(value, len(vocab))
+        self.codes[field] = codes
+        self.vocab[field] = list(vocab)
+
+    def _build_tag_postings(self):
+        # Inverted index: lowercased tag -> sorted indices of the products carrying it
+        postings: Dict[str, List[int]] = {}
+        for i, product in enumerate(self.products):
+            for tag in {tag.lower() for tag in product.tags}:
+                postings.setdefault(tag, []).append(i)
+        self.tag_postings = {tag: np.asarray(rows, dtype=np.intp) for tag, rows in postings.items()}
+
+    def _build_category_buckets(self):
+        # lowercased category -> product indices
+        self.category_buckets: Dict[str, List[int]] = {}
+        vocab = self.vocab['category']
+        for i, code in enumerate(self.codes['category']):
+            self.category_buckets.setdefault(vocab[code], []).append(i)
+
+    def refresh_featured(self):
+        """Reshuffle the featured pool; run in the background so the request path never touches the RNG"""
+        # Interleave category buckets so the pool covers every category evenly
+        buckets = [self._price_diverse_order(bucket) for bucket in self.category_buckets.values()]
+        featured: List[int] = []
+        for row in range(max((len(bucket) for bucket in buckets), default=0)):
+            for bucket in buckets:
+                if row < len(bucket):
+                    featured.append(bucket[row])
+            if len(featured) >= FEATURED_POOL_SIZE:
+                break
+        # Response dicts are built here, off the request path; browsing only rotates the ring
+        self.featured_ring = deque(self.records[i] for i in featured[:FEATURED_POOL_SIZE])
+
+    def _price_diverse_order(self, bucket: List[int]) -> List[int]:
+        # Shuffle within price bands, then take one product from each band in turn
+        by_price = np.asarray(bucket, dtype=np.int64)[np.argsort(self.prices[bucket], kind='stable')]
+        bands = [random.sample(band.tolist(), len(band)) for band in np.array_split(by_price, FEATURED_PRICE_BANDS)]
+        return [band[row] for row in range(max(map(len, bands), default=0)) for band in bands if row < len(band)]
+
+    def as_records(self, products: List[CatalogProduct]) -> List[Dict[str, Any]]:
+        """Prebuilt response dicts for the given catalog rows"""
+        return [self.records[self.id_index[product.id]] for product in products]
+
+    def sample_featured(self, k: int) -> List[Dict[str, Any]]:
+        """Next k products from the featured ring; successive calls walk the ring so browsing doesn't repeat"""
+        ring = self.featured_ring
+        picks = list(islice(ring, k))
+        ring.rotate(-len(picks))
+        return picks
+
+    def contains_mask(self, field: str, needle: str, missing_passes: bool = True) -> np.ndarray:
+        """Mask of products whose field contains needle; products without the field pass unless missing_passes is False"""
+        # Evaluate the substring test once per distinct value, then broadcast through the codes
+        vocab = self.vocab[field]
+        hits = np.fromiter((needle in value for value in vocab), dtype=bool, count=len(vocab))
+        hits[0] = missing_passes
+        return hits[self.codes[field]]
+
+    def match_scores(self, indices: np.ndarray, attributes: Dict[str, Any]) -> np.ndarray:
+        """Vectorized calculate_match_score for the given products: weighted share of the known attributes they match"""
+        score = np.zeros(len(indices), dtype=np.float64)
+        total_weight = np.zeros(len(indices), dtype=np.float64)
+
+        for field, weight in MATCH_FIELD_WEIGHTS:
+            if attributes.get(field):
+                codes = self.codes[field][indices]
+                vocab = self.vocab[field]
+                wanted = attributes[field].lower()
+                target = vocab.index(wanted) if wanted in vocab else -1
+                # Only products that have the field count towards the total
+                total_weight += np.where(codes != 0, weight, 0.0)
+                score += np.where(codes == target, weight, 0.0)
+
+        for attribute, tag_field, weight in MATCH_TAG_WEIGHTS:
+            if attributes.get(attribute):
+                column = self.tag_columns[tag_field]
+                # As with the coded fields, only products carrying such tags count towards the total
+                total_weight += np.where(column.present[indices], weight, 0.0)
+                score += np.where(column.hits(indices, attributes[attribute]), weight, 0.0)
+
+        return np.divide(score, total_weight, out=np.zeros_like(score), where=total_weight > 0)
+
+    def category_mask(self, category: str) -> np.ndarray:
+        """Mask of products in a storefront category: substring of the category column or an exact tag"""
+        category = category.lower()
+        return self.contains_mask('category', category, missing_passes=False) | self.tag_mask(category)
+
+    def index_categories(self, categories):
+        """Precompute the member list of each storefront category so listing them is a dict lookup"""
+        for category in categories:
+            category = category.lower()
+            self.category_members[category] = [self.products[i] for i in np.flatnonzero(self.category_mask(category))]
+
+    def category_products(self, category: str) -> List[CatalogProduct]:
+        """Products in a category; indexed categories are a lookup, anything else falls back to a mask scan"""
+        category = category.lower()
+        members = self.category_members.get(category)
+        if members is None:
+            # Not memoized: arbitrary client input must not grow the index
+            members = [self.products[i] for i in np.flatnonzero(self.category_mask(category))]
+        return members
+
+    def seek_after(self, members: List[CatalogProduct], after_id: str) -> Optional[int]:
+        """Offset just past after_id in a catalog-ordered product list (keyset pagination); None for an unknown id"""
+        row = self.id_index.get(after_id)
+        if row is None:
+            return None
+        # Member lists keep catalog order, so the cursor's catalog row bisects them even if it isn't a member
+        return bisect_right(members, row, key=lambda product: self.id_index[product.id])
+
+    def category_counts(self, categories) -> Dict[str, int]:
+        """Product count per storefront category, computed once per index rather than per request"""
+        return {category: len(self.category_products(category)) for category in categories}
+
+    def has_tag(self, attribute: str, wanted: str) -> bool:
+        """Whether any product has an occasion/recipient tag (per attribute) matching wanted"""
+        return self.tag_columns[ATTRIBUTE_TAG_FIELDS[attribute]].contains(wanted)
+
+    def tag_mask(self, tag: str) -> np.ndarray:
+        """Mask of products carrying tag exactly (case-insensitive)"""
+        mask = np.zeros(self.size, dtype=bool)
+        # One dict lookup; the work is proportional to the tag's posting list, not the catalog
+        postings = self.tag_postings.get(tag.lower())
+        if postings is not None:
+            mask[postings] = True
+        return mask
+
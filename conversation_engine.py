@@ -4,11 +4,11 @@ Handles enhanced conversation management with memory, context tracking, and anal
 """
 
 import os
-import json
+import re
 import logging
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 
 from database import DatabaseManager, get_database_manager, SessionCreate, MessageCreate
@@ -19,6 +19,10 @@ from rag_system import get_rag_system
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Explicit intents in a user message, each matched in one case-insensitive scan
+_STAFF_HANDOFF_RE = re.compile(r"staff|help|human|agent", re.IGNORECASE)
+_RECOMMEND_RE = re.compile(r"show|recommend|suggest|find", re.IGNORECASE)
+
 class ConversationState(Enum):
     """Conversation state enumeration"""
     INITIAL_GREETING = "initial_greeting"
@@ -50,6 +54,8 @@ class ConversationContext:
     conversation_metadata: Dict[str, Any] = None
     created_at: datetime = None
     updated_at: datetime = None
+    # Copy of preferences shared by message records until update_preferences changes them
+    _preferences_snapshot: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         if self.preferences is None:
@@ -65,6 +71,12 @@ class ConversationContext:
         if self.updated_at is None:
             self.updated_at = datetime.utcnow()
 
+    def snapshot_preferences(self) -> Dict[str, Any]:
+        """Preferences as of this turn, copied once per change rather than once per message"""
+        if self._preferences_snapshot is None:
+            self._preferences_snapshot = self.preferences.copy()
+        return self._preferences_snapshot
+
 @dataclass
 class ConversationResponse:
     """Conversation response data structure"""
@@ -197,13 +209,14 @@ class EnhancedConversationEngine:
         """Add message to conversation context and database"""
         try:
             db = next(self.db_manager.get_db())
+            preferences_at_turn = context.snapshot_preferences()
             
             # Add to database
             message_data = MessageCreate(
                 session_id=context.session_id,
                 role=role,
                 content=content,
-                preferences_at_turn=context.preferences.copy(),
+                preferences_at_turn=preferences_at_turn,
                 llm_metadata=llm_metadata or {}
             )
             
@@ -214,7 +227,7 @@ class EnhancedConversationEngine:
                 "role": role,
                 "content": content,
                 "timestamp": message.created_at.isoformat(),
-                "preferences": context.preferences.copy()
+                "preferences": preferences_at_turn
             })
             
             # Keep only recent history in memory
@@ -244,6 +257,7 @@ class EnhancedConversationEngine:
                         context.preferences[key] = new_preferences[key]
                     elif new_preferences[key] is None:
                         context.preferences[key] = None
+            context._preferences_snapshot = None
             
             context.updated_at = datetime.utcnow()
             
@@ -298,14 +312,12 @@ class EnhancedConversationEngine:
         """Determine next conversation action based on context"""
         try:
             # Check for explicit user intents
-            user_message_lower = user_message.lower()
-            
             # Staff handoff requests
-            if any(keyword in user_message_lower for keyword in ["staff", "help", "human", "agent"]):
+            if _STAFF_HANDOFF_RE.search(user_message):
                 return ConversationAction.OFFER_STAFF_HANDOFF, "staff_handoff_requested"
             
             # Product recommendation requests
-            if any(keyword in user_message_lower for keyword in ["show", "recommend", "suggest", "find"]):
+            if _RECOMMEND_RE.search(user_message):
                 return ConversationAction.RECOMMEND_PRODUCTS, "ready_for_recommendation"
             
             # Check preference completeness
@@ -1,26 +1,34 @@
 import os
-import json
+import orjson
+import asyncio
 import uuid
 import logging
-import random
-from typing import Optional, List, Dict, Any
-from fastapi import FastAPI
+import re
+import numpy as np
+from collections import Counter
+from cachetools import TTLCache
+from typing import Optional, List, Dict, Any, Tuple
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from dotenv import load_dotenv
 
 from database import init_database, wait_for_db, get_database_manager
-from vector_db import initialize_vector_database_with_products
-from rag_system import get_rag_system
+from rag_system import get_rag_system, RAGBatcher
 from staff_dashboard import create_staff_dashboard_routes
+from cache import get_async_redis_client
+from catalog_index import (
+    CatalogIndex, CatalogProduct, FILTER_FIELDS, FEATURED_REFRESH_SECONDS,
+    calculate_match_score,
+)
 
 # --- Configuration & Initialization ---
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
 
-app = FastAPI(title="Joxy Retail AI Assistant API")
+app = FastAPI(title="Joxy Retail AI Assistant API", default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
@@ -28,42 +36,207 @@ app.add_middleware(
 )
 
 # --- Global Instances & Data ---
-SESSIONS = {}  # In-memory session storage for simplicity
+session_store = get_async_redis_client()  # Redis-backed, shared across workers
 PRODUCT_CATALOG = []
-rag_system = None
+CATALOG_INDEX = CatalogIndex(PRODUCT_CATALOG)
+TOTAL_PRODUCTS = 0
+# Content hash of the loaded catalog; product listing ETags are derived from it
+CATALOG_VERSION = CATALOG_INDEX.version
+# Storefront categories: (keyword, name, description, icon); counts are rebuilt with the catalog index
+PRODUCT_CATEGORIES = (
+    ("ring", "Rings", "Engagement rings, wedding bands, and fashion rings", "diamond"),
+    ("necklace", "Necklaces", "Pendants, chains, and statement necklaces", "favorite"),
+    ("earring", "Earrings", "Studs, hoops, and drop earrings", "star"),
+    ("bracelet", "Bracelets", "Charm bracelets, bangles, and tennis bracelets", "circle"),
+    ("watch", "Watches", "Luxury timepieces and smartwatches", "schedule"),
+    ("pendant", "Pendants", "Charm pendants and gemstone pendants", "favorite_border"),
+)
+CATEGORY_KEYWORDS = tuple(keyword for keyword, _, _, _ in PRODUCT_CATEGORIES)
+CATALOG_INDEX.index_categories(CATEGORY_KEYWORDS)
+CATEGORY_COUNTS = CATALOG_INDEX.category_counts(CATEGORY_KEYWORDS)
+# Button vocabulary embedded once at startup so attribute queries skip the encoder
+CANONICAL_ATTRIBUTE_TERMS = (
+    "wedding", "birthday", "anniversary", "graduation", "holiday",
+    "wife", "husband", "girlfriend", "boyfriend", "mother",
+    "rings", "necklaces", "earrings", "pendants", "bracelets", "watches",
+    "gold", "silver", "platinum", "rose gold", "white gold",
+    "classic", "modern", "vintage", "minimalist", "bold", "elegant",
+    "diamond", "sapphire", "ruby", "emerald", "pearl", "none",
+)
+
+# Attributes that make up the retrieval query, in query order
+SEARCH_TERM_ATTRIBUTES = ('occasion', 'recipient', 'category', 'metal', 'style', 'gemstone')
+
+# Attributes that carry enough intent to be worth a vector search on their own
+RAG_SIGNAL_ATTRIBUTES = ('occasion', 'recipient')
+
+# Attributes that determine a recommendation result; the exact-match cache is keyed on these
+RECOMMENDATION_KEY_ATTRIBUTES = ('occasion', 'recipient', 'category', 'metal', 'style', 'gemstone', 'budget_max')
+
+# Per-worker recommendation results in front of Redis, keyed by the catalog version and the
+# RECOMMENDATION_KEY_ATTRIBUTES values; expires with the Redis copy and is cleared whenever the catalog reloads
+LOCAL_RECOMMENDATIONS = TTLCache(
+    maxsize=int(os.getenv("LOCAL_RECOMMENDATION_CACHE_SIZE", "1024")),
+    ttl=session_store.recommendation_ttl,
+)
+
+# Recommendation computations in progress, by the same key; concurrent duplicates await the first one
+RECOMMENDATIONS_IN_FLIGHT: Dict[tuple, asyncio.Future] = {}
+
+# Reciprocal-rank fusion of RAG results: 1/(k + rank) summed over the semantic (similarity)
+# order and the attribute match order, weighted towards the semantic ranking
+RRF_K = 60
+RRF_SEMANTIC_WEIGHT = 0.7
+RRF_MATCH_WEIGHT = 0.3
+
+# Recommendation path counters, logged so the low-signal cutoff can be tuned
+RECOMMENDATION_STATS = Counter()
+
+# Micro-batching window for concurrent RAG retrievals; wider windows trade latency for larger batches
+RAG_BATCH_MAX_SIZE = int(os.getenv("RAG_BATCH_MAX_SIZE", "32"))
+RAG_BATCH_MAX_WAIT_MS = float(os.getenv("RAG_BATCH_MAX_WAIT_MS", "8"))
+
+# Analytics events are queued by the request and written in batches by a background task
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() != "false"
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))
+ANALYTICS_FLUSH_BATCH = 200
+ANALYTICS_FLUSH_INTERVAL = 1.0
+ANALYTICS_STATS = Counter()
+
+# RAG singletons live on app.state and are bound once at startup
+app.state.rag_system = None
+app.state.rag_batcher = None
+app.state.featured_refresher = None
+app.state.analytics_queue = None
+app.state.analytics_flusher = None
+
+async def refresh_featured_periodically():
+    """Reshuffle the featured pool in the background so browsing picks stay fresh"""
+    while True:
+        await asyncio.sleep(FEATURED_REFRESH_SECONDS)
+        CATALOG_INDEX.refresh_featured()
+
+def load_product_catalog() -> Optional[List[CatalogProduct]]:
+    """Wait for Postgres, ensure the schema and read the catalog; None if the database never came up"""
+    if not wait_for_db():
+        return None
+    init_database()
+    db_manager = get_database_manager()
+    db = next(db_manager.get_db())
+    try:
+        product_rows = db_manager.get_all_product_rows(db)
+    finally:
+        db.close()
+    # Immutable tuples instead of per-product dicts; converted back to dicts only in responses
+    return [CatalogProduct.from_row(row) for row in product_rows]
+
+def write_analytics_batch(events: List[dict]):
+    """Blocking sink for a batch of analytics events"""
+    # In production, you'd store these in a database; for now, just log them
+    for event in events:
+        logging.info(f"Analytics: {event}")
+
+async def flush_analytics_periodically(queue: asyncio.Queue):
+    """Drain queued analytics events in batches, off the request path"""
+    while True:
+        events = [await queue.get()]
+        try:
+            while len(events) < ANALYTICS_FLUSH_BATCH and not queue.empty():
+                events.append(queue.get_nowait())
+            # Only wait for more events when the backlog didn't already fill the batch
+            if len(events) < ANALYTICS_FLUSH_BATCH:
+                await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+                while len(events) < ANALYTICS_FLUSH_BATCH and not queue.empty():
+                    events.append(queue.get_nowait())
+        except asyncio.CancelledError:
+            # Shutdown: these events are already off the queue, so write them here
+            write_analytics_batch(events)
+            raise
+        try:
+            await asyncio.to_thread(write_analytics_batch, events)
+            ANALYTICS_STATS['written'] += len(events)
+        except Exception as e:
+            logging.error(f"Error writing {len(events)} analytics events: {e}")
 
 @app.on_event("startup")
 async def startup_event():
-    global PRODUCT_CATALOG, rag_system
-    if wait_for_db():
-        init_database()
-        db_manager = get_database_manager()
-        db = next(db_manager.get_db())
-        products_from_db = db_manager.get_all_products(db)
-        db.close()
-        
-        PRODUCT_CATALOG = []
-        for product in products_from_db:
-            product_dict = {k: v for k, v in product.__dict__.items() if not k.startswith('_')}
-            PRODUCT_CATALOG.append(product_dict)
-                
-        if PRODUCT_CATALOG:
-            # IMPORTANT: This now ONLY initializes the connection, it doesn't re-index.
-            # The one-time indexing should be done via a separate script or build command.
-            rag_system = get_rag_system()
-            # This line ensures the global catalog in vector_db.py is set for fallback searches
-            get_vector_database().PRODUCT_CATALOG = PRODUCT_CATALOG
-            logging.info(f"Application startup complete with RAG system. Loaded {len(PRODUCT_CATALOG)} products.")
-        else:
-            logging.error("No products found in the database. Recommendations will fail.")
-    else:
+    global PRODUCT_CATALOG, CATALOG_INDEX, CATEGORY_COUNTS, TOTAL_PRODUCTS, CATALOG_VERSION
+    if ANALYTICS_ENABLED:
+        app.state.analytics_queue = asyncio.Queue(maxsize=ANALYTICS_QUEUE_SIZE)
+        app.state.analytics_flusher = asyncio.create_task(flush_analytics_periodically(app.state.analytics_queue))
+    # Redis, Postgres and the vector index are independent, so connect to all three concurrently.
+    # The RAG system ONLY initializes its connection here, it doesn't re-index; the one-time
+    # indexing should be done via a separate script or build command.
+    _, catalog, rag_system = await asyncio.gather(
+        session_store.connect(),
+        asyncio.to_thread(load_product_catalog),
+        asyncio.to_thread(get_rag_system),
+        return_exceptions=True,
+    )
+    if isinstance(catalog, BaseException):
+        raise catalog
+    if isinstance(rag_system, BaseException):
+        logging.error(f"RAG system unavailable, using catalog filtering only: {rag_system}")
+        rag_system = None
+    
+    if catalog is None:
         logging.critical("DATABASE NOT READY. Application startup failed.")
+        return
+    
+    PRODUCT_CATALOG = catalog
+    TOTAL_PRODUCTS = len(PRODUCT_CATALOG)
+    CATALOG_INDEX = CatalogIndex(PRODUCT_CATALOG)
+    CATALOG_VERSION = CATALOG_INDEX.version
+    CATALOG_INDEX.index_categories(CATEGORY_KEYWORDS)
+    CATEGORY_COUNTS = CATALOG_INDEX.category_counts(CATEGORY_KEYWORDS)
+    LOCAL_RECOMMENDATIONS.clear()
+    app.state.featured_refresher = asyncio.create_task(refresh_featured_periodically())
+    
+    if not PRODUCT_CATALOG:
+        logging.error("No products found in the database. Recommendations will fail.")
+        return
+    
+    if rag_system is not None:
+        app.state.rag_system = rag_system
+        app.state.rag_batcher = RAGBatcher(
+            rag_system.aretrieve_from_attributes_batch,
+            max_batch=RAG_BATCH_MAX_SIZE,
+            max_wait_ms=RAG_BATCH_MAX_WAIT_MS,
+        )
+        app.state.rag_batcher.start()
+        try:
+            await asyncio.to_thread(rag_system.warm_attribute_centroids, CANONICAL_ATTRIBUTE_TERMS)
+        except Exception as e:
+            logging.warning(f"Could not pre-embed attribute terms, they will be embedded on first use: {e}")
+    logging.info(f"Application startup complete with RAG system. Loaded {len(PRODUCT_CATALOG)} products.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if app.state.featured_refresher:
+        app.state.featured_refresher.cancel()
+    if app.state.rag_batcher:
+        await app.state.rag_batcher.stop()
+    if app.state.analytics_flusher:
+        app.state.analytics_flusher.cancel()
+        try:
+            await app.state.analytics_flusher
+        except asyncio.CancelledError:
+            pass
+        # Write whatever is still queued rather than dropping it
+        pending = []
+        while not app.state.analytics_queue.empty():
+            pending.append(app.state.analytics_queue.get_nowait())
+        if pending:
+            write_analytics_batch(pending)
+    await session_store.close()
+
 # --- Pydantic Models ---
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None
     message: str
 
 class UIOption(BaseModel):
+    model_config = ConfigDict(frozen=True)
     label: str
     value: str
 
@@ -76,76 +249,235 @@ class ChatResponse(BaseModel):
 class NewSessionRequest(BaseModel):
     session_id: Optional[str] = None
 
+# --- Action Buttons ---
+# Built once at import and shared by every response; UIOption is frozen so sharing is safe
+_TYPE_ANSWER = UIOption(label="Type your answer", value="__type__")
+_START_OVER = UIOption(label="Start Over", value="start_over")
+_ADJUST_CRITERIA = UIOption(label="Adjust Search Criteria", value="adjust_filter")
+_SIMILAR_ITEMS = UIOption(label="Show Similar Items", value="similar_design")
+_SHOW_MORE = UIOption(label="Show More", value="show_more")
+_FILTER_CATEGORY = UIOption(label="Filter by Category", value="filter_category")
+
+_INTENT_BUTTONS = (
+    UIOption(label="I'm looking for something special", value="special"),
+    UIOption(label="I'm just browsing", value="browse"),
+)
+_OCCASION_BUTTONS = (
+    UIOption(label="Wedding", value="wedding"),
+    UIOption(label="Birthday", value="birthday"),
+    UIOption(label="Anniversary", value="anniversary"),
+    UIOption(label="Other", value="other"),
+)
+_BROWSE_BUTTONS = (_SHOW_MORE, _FILTER_CATEGORY, _TYPE_ANSWER)
+_RECIPIENT_BUTTONS = (
+    UIOption(label="Wife", value="wife"),
+    UIOption(label="Husband", value="husband"),
+    UIOption(label="Girlfriend", value="girlfriend"),
+    UIOption(label="Boyfriend", value="boyfriend"),
+    UIOption(label="Mother", value="mother"),
+    _TYPE_ANSWER,
+)
+_CATEGORY_BUTTONS = (
+    UIOption(label="Rings", value="rings"),
+    UIOption(label="Necklaces", value="necklaces"),
+    UIOption(label="Earrings", value="earrings"),
+    UIOption(label="Pendants", value="pendants"),
+    UIOption(label="Bracelets", value="bracelets"),
+    UIOption(label="Watches", value="watches"),
+    _TYPE_ANSWER,
+)
+_METAL_BUTTONS = (
+    UIOption(label="Gold", value="gold"),
+    UIOption(label="Silver", value="silver"),
+    UIOption(label="Platinum", value="platinum"),
+    UIOption(label="Rose Gold", value="rose gold"),
+    UIOption(label="White Gold", value="white gold"),
+    _TYPE_ANSWER,
+)
+_STYLE_BUTTONS = (
+    UIOption(label="Classic", value="classic"),
+    UIOption(label="Modern", value="modern"),
+    UIOption(label="Vintage", value="vintage"),
+    UIOption(label="Minimalist", value="minimalist"),
+    UIOption(label="Bold", value="bold"),
+    UIOption(label="Elegant", value="elegant"),
+    _TYPE_ANSWER,
+)
+_BUDGET_BUTTONS = (
+    UIOption(label="Under $100", value="under_100"),
+    UIOption(label="$100 - $500", value="100_500"),
+    UIOption(label="$500 - $1000", value="500_1000"),
+    UIOption(label="$1000 - $2500", value="1000_2500"),
+    UIOption(label="$2500+", value="2500_plus"),
+    _TYPE_ANSWER,
+)
+_GEMSTONE_BUTTONS = (
+    UIOption(label="Diamond", value="diamond"),
+    UIOption(label="Sapphire", value="sapphire"),
+    UIOption(label="Ruby", value="ruby"),
+    UIOption(label="Emerald", value="emerald"),
+    UIOption(label="Pearl", value="pearl"),
+    UIOption(label="No Gemstone", value="none"),
+    _TYPE_ANSWER,
+)
+_SUMMARY_BUTTONS = (
+    UIOption(label="Confirm & Find Jewelry", value="find_jewelry"),
+    UIOption(label="Adjust Preferences", value="adjust_filter"),
+    _START_OVER,
+)
+_RESULTS_BUTTONS = (_SIMILAR_ITEMS, _ADJUST_CRITERIA, _TYPE_ANSWER)
+_ADJUST_BUTTONS = (
+    UIOption(label="Change Occasion", value="change_occasion"),
+    UIOption(label="Change Recipient", value="change_recipient"),
+    UIOption(label="Change Category", value="change_category"),
+    UIOption(label="Change Metal", value="change_metal"),
+    UIOption(label="Change Style", value="change_style"),
+    UIOption(label="Change Budget", value="change_budget"),
+    UIOption(label="Change Gemstone", value="change_gemstone"),
+    _START_OVER,
+    _TYPE_ANSWER,
+)
+_MORE_RESULTS_BUTTONS = (_ADJUST_CRITERIA, _TYPE_ANSWER)
+_NO_MORE_RESULTS_BUTTONS = (_ADJUST_CRITERIA, _START_OVER, _TYPE_ANSWER)
+_RECOMMENDING_HELP_BUTTONS = (_SIMILAR_ITEMS, _ADJUST_CRITERIA, _START_OVER, _TYPE_ANSWER)
+_START_OVER_BUTTONS = (_START_OVER, _TYPE_ANSWER)
+_BROWSING_HELP_BUTTONS = (_SHOW_MORE, _FILTER_CATEGORY, _START_OVER, _TYPE_ANSWER)
+_ADJUST_OCCASION_BUTTONS = (
+    UIOption(label="Birthday", value="birthday"),
+    UIOption(label="Anniversary", value="anniversary"),
+    UIOption(label="Wedding", value="wedding"),
+    UIOption(label="Graduation", value="graduation"),
+    UIOption(label="Holiday", value="holiday"),
+    _TYPE_ANSWER,
+)
+_FALLBACK_BUTTONS = (_START_OVER, UIOption(label="Browse Products", value="browse"), _TYPE_ANSWER)
+# Serialized form of each button set, built once and fed straight to orjson by the chat endpoints
+_BUTTON_DUMPS = {
+    id(buttons): [button.model_dump() for button in buttons]
+    for buttons in (
+        _INTENT_BUTTONS, _OCCASION_BUTTONS, _BROWSE_BUTTONS, _RECIPIENT_BUTTONS, _CATEGORY_BUTTONS,
+        _METAL_BUTTONS, _STYLE_BUTTONS, _BUDGET_BUTTONS, _GEMSTONE_BUTTONS, _SUMMARY_BUTTONS,
+        _RESULTS_BUTTONS, _ADJUST_BUTTONS, _MORE_RESULTS_BUTTONS, _NO_MORE_RESULTS_BUTTONS,
+        _RECOMMENDING_HELP_BUTTONS, _START_OVER_BUTTONS, _BROWSING_HELP_BUTTONS,
+        _ADJUST_OCCASION_BUTTONS, _FALLBACK_BUTTONS,
+    )
+}
+
+def dump_buttons(buttons) -> Optional[List[Dict[str, str]]]:
+    """Button models as plain dicts, using the prebuilt dumps for the constant button sets"""
+    if not buttons:
+        return None
+    dumped = _BUTTON_DUMPS.get(id(buttons))
+    return dumped if dumped is not None else [button.model_dump() for button in buttons]
+
 # --- Recommendation Logic ---
-def get_recommendations(attributes: dict) -> List[dict]:
+async def get_recommendations(attributes: dict) -> List[dict]:
+    """Get product recommendations, served from the worker-local or shared Redis cache when the same attributes were seen before"""
+    cache_attributes = {key: attributes.get(key) for key in RECOMMENDATION_KEY_ATTRIBUTES}
+    # The catalog version keeps results of a replaced catalog from being served after a reload
+    local_key = (CATALOG_VERSION, *cache_attributes.values())
+    local = LOCAL_RECOMMENDATIONS.get(local_key)
+    if local is not None:
+        RECOMMENDATION_STATS['local_hit'] += 1
+        return list(local)
+    
+    in_flight = RECOMMENDATIONS_IN_FLIGHT.get(local_key)
+    if in_flight is not None:
+        RECOMMENDATION_STATS['coalesced'] += 1
+        # shield: one waiter being cancelled must not cancel the shared computation
+        return list(await asyncio.shield(in_flight))
+    
+    future = asyncio.get_running_loop().create_future()
+    RECOMMENDATIONS_IN_FLIGHT[local_key] = future
+    try:
+        products = await _load_recommendations(attributes, cache_attributes, local_key)
+        future.set_result(tuple(products))
+        return products
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # retrieved here, so an unawaited failure isn't logged as lost
+        raise
+    finally:
+        del RECOMMENDATIONS_IN_FLIGHT[local_key]
+
+async def _load_recommendations(attributes: dict, cache_attributes: dict, local_key: tuple) -> List[dict]:
+    """Shared Redis cache, then a fresh computation; fills the worker-local cache either way"""
+    cached = await session_store.get_recommendations(local_key[0], cache_attributes)
+    if cached is not None:
+        RECOMMENDATION_STATS['cache_hit'] += 1
+        LOCAL_RECOMMENDATIONS[local_key] = tuple(cached)
+        return cached
+    
+    products = await compute_recommendations(attributes)
+    if products:
+        LOCAL_RECOMMENDATIONS[local_key] = tuple(products)
+        await session_store.set_recommendations(local_key[0], cache_attributes, products)
+    return products
+
+async def compute_recommendations(attributes: dict) -> List[dict]:
     """Get product recommendations based on user attributes with improved matching"""
+    rag_batcher = app.state.rag_batcher
     try:
         # Build search query based on available attributes
-        search_terms = []
-        
-        if attributes.get('occasion'):
-            search_terms.append(attributes['occasion'])
-        
-        if attributes.get('recipient'):
-            search_terms.append(attributes['recipient'])
+        search_terms = [attributes[key] for key in SEARCH_TERM_ATTRIBUTES if attributes.get(key)]
         
-        if attributes.get('category'):
-            search_terms.append(attributes['category'])
-        
-        if attributes.get('metal'):
-            search_terms.append(attributes['metal'])
-        
-        if attributes.get('style'):
-            search_terms.append(attributes['style'])
-        
-        if attributes.get('gemstone'):
-            search_terms.append(attributes['gemstone'])
+        # Without an occasion or recipient the query embedding says little beyond the
+        # catalog filters, so skip the retrieval and go straight to the fallback.
+        # An occasion/recipient that no product is tagged with can't be matched either,
+        # so it only counts as signal if the tag index knows it.
+        signal_attributes = [key for key in RAG_SIGNAL_ATTRIBUTES if attributes.get(key)]
+        has_signal = any(CATALOG_INDEX.has_tag(key, attributes[key]) for key in signal_attributes)
+        if search_terms and rag_batcher and not has_signal:
+            reason, label = ('rag_skipped_untagged', 'untagged') if signal_attributes else ('rag_skipped_low_signal', 'low-signal')
+            RECOMMENDATION_STATS[reason] += 1
+            logging.info(f"Skipping RAG for {label} attributes {search_terms} "
+                         f"(skipped {RECOMMENDATION_STATS[reason]} times)")
         
         # If we have search terms, use RAG system
-        if search_terms:
-            query = " ".join(search_terms)
-            logging.info(f"Searching with query: {query}")
+        if search_terms and rag_batcher and has_signal:
+            RECOMMENDATION_STATS['rag'] += 1
+            logging.info(f"Searching with attributes: {search_terms}")
             
-            # Get RAG recommendations
-            rag_products = rag_system.get_recommendations(query, limit=15)
+            # Get RAG recommendations; concurrent requests share one batched retrieval,
+            # and the query vector is composed from cached per-term embeddings
+            rag_products = await rag_batcher.submit(tuple(search_terms), {'budget_max': attributes.get('budget_max')}, top_k=15)
             
             if rag_products:
-                # Convert to clean dictionaries and apply comprehensive filtering
-                clean_products = []
+                # RAGSystem always returns plain product dicts (Pinecone metadata plus id and score)
                 budget_max = attributes.get('budget_max')
                 
-                for product in rag_products:
-                    if isinstance(product, dict):
-                        product_dict = product
-                    else:
-                        # Handle SQLAlchemy objects if needed
-                        product_dict = {
-                            'id': getattr(product, 'id', None),
-                            'name': getattr(product, 'name', ''),
-                            'description': getattr(product, 'description', ''),
-                            'price': getattr(product, 'price', 0.0),
-                            'category': getattr(product, 'category', ''),
-                            'metal': getattr(product, 'metal', ''),
-                            'style': getattr(product, 'style', ''),
-                            'gemstone': getattr(product, 'gemstone', ''),
-                            'style_tags': getattr(product, 'style_tags', []),
-                            'image_url': getattr(product, 'image_url', '')
-                        }
-                    
-                    # Apply comprehensive attribute matching
-                    match_score = calculate_match_score(product_dict, attributes)
-                    
-                    # Apply budget filter if specified
-                    if budget_max and product_dict.get('price', 0) > budget_max:
-                        continue
-                    
-                    # Only include products with good match scores
-                    if match_score >= 0.3:  # Minimum 30% match
-                        product_dict['match_score'] = match_score
-                        clean_products.append(product_dict)
+                # Score catalog products in one vectorized pass over the coded columns;
+                # products the index doesn't know fall back to the dict scorer
+                catalog_rows = np.array([CATALOG_INDEX.id_index.get(product.get('id'), -1) for product in rag_products], dtype=np.intp)
+                known = catalog_rows >= 0
+                match_scores = np.empty(len(rag_products), dtype=np.float64)
+                match_scores[known] = CATALOG_INDEX.match_scores(catalog_rows[known], attributes)
+                for i in np.flatnonzero(~known).tolist():
+                    match_scores[i] = calculate_match_score(rag_products[i], attributes)
+                prices = np.fromiter((product.get('price', 0) for product in rag_products), dtype=np.float64, count=len(rag_products))
+                
+                # Only include products with good match scores (at least 30%) within budget
+                keep = match_scores >= 0.3
+                if budget_max:
+                    keep &= prices <= budget_max
+                candidates = np.flatnonzero(keep)
                 
-                # Sort by match score and price
-                clean_products.sort(key=lambda x: (-x.get('match_score', 0), x.get('price', 0)))
+                # Sort by the fused rank, then price. RAG results arrive best similarity first, so
+                # candidate order is the semantic rank; equally matched products share a match rank
+                candidate_scores = -match_scores[candidates]
+                match_rank = np.searchsorted(np.sort(candidate_scores), candidate_scores) + 1
+                semantic_rank = np.arange(1, len(candidates) + 1)
+                fused = RRF_SEMANTIC_WEIGHT / (RRF_K + semantic_rank) + RRF_MATCH_WEIGHT / (RRF_K + match_rank)
+                ranked = candidates[np.lexsort((prices[candidates], -fused))]
+                
+                clean_products = []
+                for i in ranked.tolist():
+                    product_dict = rag_products[i]
+                    product_dict['match_score'] = float(match_scores[i])
+                    clean_products.append(product_dict)
                 
                 logging.info(f"Found {len(clean_products)} well-matched products within budget")
                 return clean_products[:6]  # Return top 6 results
@@ -153,512 +485,383 @@ def get_recommendations(attributes: dict) -> List[dict]:
         # Fallback: use attribute-based filtering on PRODUCT_CATALOG
         if PRODUCT_CATALOG:
             logging.info("Using attribute-based filtering on product catalog")
-            filtered_products = filter_products_by_attributes(PRODUCT_CATALOG, attributes)
+            # The catalog scan is CPU-bound; keep it off the event loop
+            # Budget ordering and the top-6 cut happen inside the vectorized filter
+            filtered_products = await asyncio.to_thread(filter_products_by_attributes, CATALOG_INDEX, attributes, 6)
             
             if filtered_products:
-                # Sort by relevance and price
-                budget_max = attributes.get('budget_max')
-                if budget_max:
-                    filtered_products.sort(key=lambda x: (x.get('price', 0), x.get('name', '')))
-                
                 logging.info(f"Found {len(filtered_products)} products using attribute filtering")
-                return filtered_products[:6]
+                return CATALOG_INDEX.as_records(filtered_products)
         
         return []
         
     except Exception as e:
-        logging.error(f"Error in get_recommendations: {e}")
+        logging.error(f"Error in compute_recommendations: {e}")
         return []
 
-def calculate_match_score(product: dict, attributes: dict) -> float:
-    """Calculate how well a product matches user attributes (0.0 to 1.0)"""
-    score = 0.0
-    total_weight = 0.0
-    
-    # Category matching (high weight)
-    if attributes.get('category') and product.get('category'):
-        if attributes['category'].lower() == product['category'].lower():
-            score += 0.3
-        total_weight += 0.3
+def filter_products_by_attributes(catalog: CatalogIndex, attributes: dict, limit: Optional[int] = None) -> List[CatalogProduct]:
+    """Filter products based on user attributes using vectorized masks over the catalog columns;
+    with a budget, matches come back cheapest first (ties by name)"""
+    mask = np.ones(catalog.size, dtype=bool)
     
-    # Metal matching (high weight)
-    if attributes.get('metal') and product.get('metal'):
-        if attributes['metal'].lower() == product['metal'].lower():
-            score += 0.25
-        total_weight += 0.25
-    
-    # Style matching (medium weight)
-    if attributes.get('style') and product.get('style'):
-        if attributes['style'].lower() == product['style'].lower():
-            score += 0.2
-        total_weight += 0.2
-    
-    # Gemstone matching (medium weight)
-    if attributes.get('gemstone') and product.get('gemstone'):
-        if attributes['gemstone'].lower() == product['gemstone'].lower():
-            score += 0.15
-        total_weight += 0.15
-    
-    # Occasion and recipient matching (lower weight)
-    if attributes.get('occasion') and product.get('style_tags'):
-        if any(attributes['occasion'].lower() in tag.lower() for tag in product['style_tags']):
-            score += 0.05
-        total_weight += 0.05
-    
-    if attributes.get('recipient') and product.get('style_tags'):
-        if any(attributes['recipient'].lower() in tag.lower() for tag in product['style_tags']):
-            score += 0.05
-        total_weight += 0.05
-    
-    # Normalize score
-    if total_weight > 0:
-        return score / total_weight
-    return 0.0
-
-def filter_products_by_attributes(products: List[dict], attributes: dict) -> List[dict]:
-    """Filter products based on user attributes"""
-    filtered = []
+    # Apply budget filter
     budget_max = attributes.get('budget_max')
+    if budget_max:
+        mask &= catalog.prices <= budget_max
     
-    for product in products:
-        # Apply budget filter
-        if budget_max and product.get('price', 0) > budget_max:
-            continue
-        
-        # Apply category filter
-        if attributes.get('category') and product.get('category'):
-            if attributes['category'].lower() not in product['category'].lower():
-                continue
-        
-        # Apply metal filter
-        if attributes.get('metal') and product.get('metal'):
-            if attributes['metal'].lower() not in product['metal'].lower():
-                continue
-        
-        # Apply style filter
-        if attributes.get('style') and product.get('style'):
-            if attributes['style'].lower() not in product['style'].lower():
-                continue
-        
-        # Apply gemstone filter
-        if attributes.get('gemstone') and product.get('gemstone'):
-            if attributes['gemstone'].lower() not in product['gemstone'].lower():
-                continue
-        
-        filtered.append(product)
+    # Apply category, metal, style and gemstone filters
+    for field in FILTER_FIELDS:
+        if attributes.get(field):
+            mask &= catalog.contains_mask(field, attributes[field].lower())
     
-    return filtered
+    indices = np.flatnonzero(mask)
+    if budget_max:
+        indices = indices[np.lexsort((catalog.name_ranks[indices], catalog.prices[indices]))]
+    return [catalog.products[i] for i in indices[:limit]]
 
 # --- Conversational Flow State Machine ---
-def process_turn(session: Dict, user_message: str) -> Dict:
-    state = session.get('state', 'AWAITING_NAME')
-    attributes = session.get('attributes', {})
+# Keyword matchers compiled once; each is a substring alternation over the lowercased message
+_SPECIAL_INTENT_RE = re.compile(r"special")
+_CONFIRM_RE = re.compile(r"yes|find|perfect|confirm")
+
+def _compile_keyword_classifier(tagged_keywords: Dict[str, tuple]) -> re.Pattern:
+    """One pattern tagging every keyword occurrence; the lookahead makes overlapping hits visible"""
+    groups = "|".join(f"(?P<{tag}>{'|'.join(map(re.escape, keywords))})" for tag, keywords in tagged_keywords.items())
+    return re.compile(f"(?=(?:{groups}))")
+
+def _keyword_tags(classifier: re.Pattern, message_lc: str) -> set:
+    """Tags of all keywords found in the message, in one scan"""
+    return {match.lastgroup for match in classifier.finditer(message_lc)}
+
+_RECOMMENDING_CLASSIFIER = _compile_keyword_classifier({
+    'similar': ('similar', 'like', 'same', 'more'),
+    'adjust': ('adjust', 'change', 'different', 'filter'),
+})
+_BROWSING_CLASSIFIER = _compile_keyword_classifier({
+    'more': ('more', 'show', 'browse', 'explore'),
+    'filter': ('filter', 'category', 'type'),
+})
+# Adjustable field -> (next state, prompt, buttons); insertion order is the priority when several fields are named
+_ADJUST_DISPATCH = {
+    'occasion': ('AWAITING_OCCASION', "What's the occasion for this gift? (e.g., birthday, anniversary, wedding, graduation, holiday)", _ADJUST_OCCASION_BUTTONS),
+    'recipient': ('AWAITING_RECIPIENT', "Who is this gift for? (e.g., wife, husband, girlfriend, boyfriend, mother, father, friend)", _RECIPIENT_BUTTONS),
+    'category': ('AWAITING_CATEGORY', "What type of jewelry are you looking for? (e.g., rings, necklaces, earrings, pendants, bracelets, watches)", _CATEGORY_BUTTONS),
+    'metal': ('AWAITING_METAL', "What metal type would you prefer? (e.g., gold, silver, platinum, rose gold, white gold)", _METAL_BUTTONS),
+    'style': ('AWAITING_STYLE', "What style are you looking for? (e.g., classic, modern, vintage, minimalist, bold, elegant)", _STYLE_BUTTONS),
+    'budget': ('AWAITING_BUDGET', "What's your budget range for this gift?", _BUDGET_BUTTONS),
+    'gemstone': ('AWAITING_GEMSTONE', "Do you have a preference for gemstones? (e.g., diamond, sapphire, ruby, emerald, pearl, none)", _GEMSTONE_BUTTONS),
+}
+_ADJUST_FIELD_CLASSIFIER = _compile_keyword_classifier({field: (field,) for field in _ADJUST_DISPATCH})
+
+# Budget button values map straight to their upper bound
+_BUDGET_BUTTON_MAX = {
+    'under_100': 100.0,
+    '100_500': 500.0,
+    '500_1000': 1000.0,
+    '1000_2500': 2500.0,
+    '2500_plus': 10000.0,
+}
+# Amounts with an optional thousands suffix: "300", "$1,500", "2k", "2.5k"
+_BUDGET_NUMBER_RE = re.compile(r"(\d[\d,]*(?:\.\d+)?)(k\b)?")
+# An open-ended word only overrides a number it directly qualifies: "over 300", "2500+", "$1,000 plus"
+_BUDGET_OPEN_ENDED_NUMBER_RE = re.compile(r"\b(?:over|above|more than)\s*\$?\s*\d|\d[\d,]*(?:\.\d+)?k?\s*(?:\+|plus\b)")
+# ...unless it is negated: "don't want to go over 300", "not more than 500", "nothing over 300"
+_BUDGET_NEGATED_RE = re.compile(r"(?:\bnot|n't|\bno|\bnever|\bnothing|\bnone)\b(?:\s+\w+){0,3}?\s+(?:over|above|more than)\b")
+_BUDGET_OPEN_ENDED_RE = re.compile(r"\b(?:plus|above|over)\b|\+")
+_BUDGET_UNDER_RE = re.compile(r"\bunder\b")
+_BUDGET_HIGH_END = 10000.0
+_DEFAULT_BUDGET = 1000.0
+
+def parse_budget(message_lc: str) -> float:
+    """Upper budget bound from a budget button value or free text like 'under 300', '$1,500', 'around 2k' or 'over 2000'"""
+    if message_lc in _BUDGET_BUTTON_MAX:
+        return _BUDGET_BUTTON_MAX[message_lc]
+    numbers = _BUDGET_NUMBER_RE.findall(message_lc)
+    if numbers:
+        if _BUDGET_OPEN_ENDED_NUMBER_RE.search(message_lc) and not _BUDGET_NEGATED_RE.search(message_lc):
+            return _BUDGET_HIGH_END
+        amount, thousands = numbers[-1]
+        return float(amount.replace(',', '')) * (1000 if thousands else 1)
+    if _BUDGET_OPEN_ENDED_RE.search(message_lc):
+        return _BUDGET_HIGH_END
+    if _BUDGET_UNDER_RE.search(message_lc):
+        return 100.0
+    return _DEFAULT_BUDGET
+
+async def _handle_awaiting_name(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
     response = {}
+    attributes['name'] = user_message.strip()
+    session['state'] = 'AWAITING_INTENT'
+    response['reply'] = f"Hi {attributes['name']}! Are you looking for something special or just browsing today?"
+    response['action_buttons'] = _INTENT_BUTTONS
+    return response
 
-    # Log the current state and user message for debugging
-    logging.info(f"Conversation state: {state}, User message: '{user_message}', Attributes: {attributes}")
-    
-    if state == 'AWAITING_NAME':
-        attributes['name'] = user_message.strip()
-        session['state'] = 'AWAITING_INTENT'
-        response['reply'] = f"Hi {attributes['name']}! Are you looking for something special or just browsing today?"
-        response['action_buttons'] = [UIOption(label="I'm looking for something special", value="special"), UIOption(label="I'm just browsing", value="browse")]
-    
-    elif state == 'AWAITING_INTENT':
-        if 'special' in user_message.lower():
-            attributes['intent'] = 'special'
-            session['state'] = 'AWAITING_OCCASION'
-            response['reply'] = "Excellent! What is the special occasion?"
-            response['action_buttons'] = [UIOption(label="Wedding", value="wedding"), UIOption(label="Birthday", value="birthday"), UIOption(label="Anniversary", value="anniversary"), UIOption(label="Other", value="other")]
-        else:
-            attributes['intent'] = 'browse'
-            session['state'] = 'BROWSING'
-            response['reply'] = "No problem! Here are some of our most popular items to get you started."
-            response['products'] = random.sample(PRODUCT_CATALOG, 4) if PRODUCT_CATALOG else []
-            response['action_buttons'] = [
-                UIOption(label="Show More", value="show_more"),
-                UIOption(label="Filter by Category", value="filter_category"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-
-    elif state == 'AWAITING_OCCASION':
-        attributes['occasion'] = user_message.lower()
-        session['state'] = 'AWAITING_RECIPIENT'
-        response['reply'] = f"Perfect! A {attributes['occasion']} gift. Who is this gift for? (e.g., wife, husband, girlfriend, boyfriend, mother, father, friend)"
-        response['action_buttons'] = [
-            UIOption(label="Wife", value="wife"),
-            UIOption(label="Husband", value="husband"),
-            UIOption(label="Girlfriend", value="girlfriend"),
-            UIOption(label="Boyfriend", value="boyfriend"),
-            UIOption(label="Mother", value="mother"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
-    
-    elif state == 'AWAITING_RECIPIENT':
-        attributes['recipient'] = user_message.lower()
-        session['state'] = 'AWAITING_CATEGORY'
-        response['reply'] = f"Great! I'll help you find the perfect gift for your {attributes['recipient']}. What type of jewelry are you looking for? (e.g., rings, necklaces, earrings, pendants, bracelets, watches)"
-        response['action_buttons'] = [
-            UIOption(label="Rings", value="rings"),
-            UIOption(label="Necklaces", value="necklaces"),
-            UIOption(label="Earrings", value="earrings"),
-            UIOption(label="Pendants", value="pendants"),
-            UIOption(label="Bracelets", value="bracelets"),
-            UIOption(label="Watches", value="watches"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
-    
-    elif state == 'AWAITING_CATEGORY':
-        attributes['category'] = user_message.lower()
-        session['state'] = 'AWAITING_METAL'
-        response['reply'] = f"Perfect! {attributes['category'].title()} are a great choice. What metal type would you prefer? (e.g., gold, silver, platinum, rose gold, white gold)"
-        response['action_buttons'] = [
-            UIOption(label="Gold", value="gold"),
-            UIOption(label="Silver", value="silver"),
-            UIOption(label="Platinum", value="platinum"),
-            UIOption(label="Rose Gold", value="rose gold"),
-            UIOption(label="White Gold", value="white gold"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
-    
-    elif state == 'AWAITING_METAL':
-        attributes['metal'] = user_message.lower()
-        session['state'] = 'AWAITING_STYLE'
-        response['reply'] = f"Great choice! {attributes['metal'].title()} is beautiful. What style are you looking for? (e.g., classic, modern, vintage, minimalist, bold, elegant)"
-        response['action_buttons'] = [
-            UIOption(label="Classic", value="classic"),
-            UIOption(label="Modern", value="modern"),
-            UIOption(label="Vintage", value="vintage"),
-            UIOption(label="Minimalist", value="minimalist"),
-            UIOption(label="Bold", value="bold"),
-            UIOption(label="Elegant", value="elegant"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
-    
-    elif state == 'AWAITING_STYLE':
-        attributes['style'] = user_message.lower()
-        session['state'] = 'AWAITING_BUDGET'
-        response['reply'] = f"Perfect! {attributes['style'].title()} style is a great choice. What's your budget range for this gift?"
-        response['action_buttons'] = [
-            UIOption(label="Under $100", value="under_100"),
-            UIOption(label="$100 - $500", value="100_500"),
-            UIOption(label="$500 - $1000", value="500_1000"),
-            UIOption(label="$1000 - $2500", value="1000_2500"),
-            UIOption(label="$2500+", value="2500_plus"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
-    
-    elif state == 'AWAITING_BUDGET':
-        # Parse budget from user input or button selection
-        budget_input = user_message.lower()
-        if 'under' in budget_input or '100' in budget_input:
-            attributes['budget_max'] = 100.0
-        elif '500' in budget_input:
-            attributes['budget_max'] = 500.0
-        elif '1000' in budget_input:
-            attributes['budget_max'] = 1000.0
-        elif '2500' in budget_input:
-            attributes['budget_max'] = 2500.0
-        elif 'plus' in budget_input or '+' in budget_input:
-            attributes['budget_max'] = 10000.0  # High-end budget
-        else:
-            # Try to extract numeric value from text
-            import re
-            numbers = re.findall(r'\d+', budget_input)
-            if numbers:
-                attributes['budget_max'] = float(numbers[-1])
-            else:
-                attributes['budget_max'] = 1000.0  # Default budget
-        
-        session['state'] = 'AWAITING_GEMSTONE'
-        response['reply'] = f"Great! Budget set to ${attributes['budget_max']:.0f}. Do you have a preference for gemstones? (e.g., diamond, sapphire, ruby, emerald, pearl, none)"
-        response['action_buttons'] = [
-            UIOption(label="Diamond", value="diamond"),
-            UIOption(label="Sapphire", value="sapphire"),
-            UIOption(label="Ruby", value="ruby"),
-            UIOption(label="Emerald", value="emerald"),
-            UIOption(label="Pearl", value="pearl"),
-            UIOption(label="No Gemstone", value="none"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
+async def _handle_awaiting_intent(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    if _SPECIAL_INTENT_RE.search(message_lc):
+        attributes['intent'] = 'special'
+        session['state'] = 'AWAITING_OCCASION'
+        response['reply'] = "Excellent! What is the special occasion?"
+        response['action_buttons'] = _OCCASION_BUTTONS
+    else:
+        attributes['intent'] = 'browse'
+        session['state'] = 'BROWSING'
+        response['reply'] = "No problem! Here are some of our most popular items to get you started."
+        response['products'] = CATALOG_INDEX.sample_featured(4)
+        response['action_buttons'] = _BROWSE_BUTTONS
+    return response
+
+async def _handle_awaiting_occasion(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    attributes['occasion'] = message_lc
+    session['state'] = 'AWAITING_RECIPIENT'
+    response['reply'] = f"Perfect! A {attributes['occasion']} gift. Who is this gift for? (e.g., wife, husband, girlfriend, boyfriend, mother, father, friend)"
+    response['action_buttons'] = _RECIPIENT_BUTTONS
+    return response
+
+async def _handle_awaiting_recipient(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    attributes['recipient'] = message_lc
+    session['state'] = 'AWAITING_CATEGORY'
+    response['reply'] = f"Great! I'll help you find the perfect gift for your {attributes['recipient']}. What type of jewelry are you looking for? (e.g., rings, necklaces, earrings, pendants, bracelets, watches)"
+    response['action_buttons'] = _CATEGORY_BUTTONS
+    return response
+
+async def _handle_awaiting_category(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    attributes['category'] = message_lc
+    session['state'] = 'AWAITING_METAL'
+    response['reply'] = f"Perfect! {attributes['category'].title()} are a great choice. What metal type would you prefer? (e.g., gold, silver, platinum, rose gold, white gold)"
+    response['action_buttons'] = _METAL_BUTTONS
+    return response
+
+async def _handle_awaiting_metal(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    attributes['metal'] = message_lc
+    session['state'] = 'AWAITING_STYLE'
+    response['reply'] = f"Great choice! {attributes['metal'].title()} is beautiful. What style are you looking for? (e.g., classic, modern, vintage, minimalist, bold, elegant)"
+    response['action_buttons'] = _STYLE_BUTTONS
+    return response
+
+async def _handle_awaiting_style(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    attributes['style'] = message_lc
+    session['state'] = 'AWAITING_BUDGET'
+    response['reply'] = f"Perfect! {attributes['style'].title()} style is a great choice. What's your budget range for this gift?"
+    response['action_buttons'] = _BUDGET_BUTTONS
+    return response
+
+async def _handle_awaiting_budget(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    # Parse budget from user input or button selection
+    attributes['budget_max'] = parse_budget(message_lc)
     
-    elif state == 'AWAITING_GEMSTONE':
-        attributes['gemstone'] = user_message.lower()
-        session['state'] = 'SHOWING_SUMMARY'
-        
-        # Create a professional summary of all collected preferences
-        summary = f"Excellent! I've collected all your preferences. Let me confirm the details:\n\n"
-        summary += f"**Occasion**: {attributes.get('occasion', 'Not specified').title()}\n"
-        summary += f"**Recipient**: {attributes.get('recipient', 'Not specified').title()}\n"
-        summary += f"**Jewelry Type**: {attributes.get('category', 'Not specified').title()}\n"
-        summary += f"**Metal**: {attributes.get('metal', 'Not specified').title()}\n"
-        summary += f"**Style**: {attributes.get('style', 'Not specified').title()}\n"
-        summary += f"**Budget**: ${attributes.get('budget_max', 'Not specified'):.0f}\n"
-        summary += f"**Gemstone**: {attributes.get('gemstone', 'Not specified').title()}\n\n"
-        summary += f"Please confirm if these details are correct, and I'll search our collection for the perfect match."
-        
-        response['reply'] = summary
-        response['action_buttons'] = [
-            UIOption(label="Confirm & Find Jewelry", value="find_jewelry"),
-            UIOption(label="Adjust Preferences", value="adjust_filter"),
-            UIOption(label="Start Over", value="start_over")
-        ]
+    session['state'] = 'AWAITING_GEMSTONE'
+    response['reply'] = f"Great! Budget set to ${attributes['budget_max']:.0f}. Do you have a preference for gemstones? (e.g., diamond, sapphire, ruby, emerald, pearl, none)"
+    response['action_buttons'] = _GEMSTONE_BUTTONS
+    return response
+
+async def _handle_awaiting_gemstone(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    attributes['gemstone'] = message_lc
+    session['state'] = 'SHOWING_SUMMARY'
     
-    elif state == 'SHOWING_SUMMARY':
-        if 'yes' in user_message.lower() or 'find' in user_message.lower() or 'perfect' in user_message.lower() or 'confirm' in user_message.lower():
-            session['state'] = 'RECOMMENDING'
-            products = get_recommendations(attributes)
-            if products:
-                response['reply'] = f"Perfect! I've found {len(products)} excellent options that match your preferences for {attributes.get('occasion', '')} {attributes.get('category', 'jewelry')} in {attributes.get('metal', '')} with {attributes.get('style', '')} style. Here are your personalized recommendations:"
-                response['products'] = products
-                # Add action buttons after recommendations
-                response['action_buttons'] = [
-                    UIOption(label="Show Similar Items", value="similar_design"),
-                    UIOption(label="Adjust Search Criteria", value="adjust_filter"),
-                    UIOption(label="Type your answer", value="__type__")
-                ]
-            else:
-                response['reply'] = f"I've searched our collection for {attributes.get('occasion', '')} {attributes.get('category', 'jewelry')} in {attributes.get('metal', '')} with {attributes.get('style', '')} style and {attributes.get('gemstone', '')} gemstone under ${attributes.get('budget_max', 0):.0f}, but couldn't find an exact match. However, here are some excellent alternatives you might consider:"
-                response['products'] = random.sample(PRODUCT_CATALOG, 4) if PRODUCT_CATALOG else []
-                response['action_buttons'] = [
-                    UIOption(label="Show Similar Items", value="similar_design"),
-                    UIOption(label="Adjust Search Criteria", value="adjust_filter"),
-                    UIOption(label="Type your answer", value="__type__")
-                ]
-                session['state'] = 'BROWSING'
-        else:
-            session['state'] = 'ADJUSTING_FILTERS'
-            response['reply'] = "No problem! What would you like to adjust? (occasion, recipient, category, metal, style, budget, or gemstone)"
-            response['action_buttons'] = [
-                UIOption(label="Change Occasion", value="change_occasion"),
-                UIOption(label="Change Recipient", value="change_recipient"),
-                UIOption(label="Change Category", value="change_category"),
-                UIOption(label="Change Metal", value="change_metal"),
-                UIOption(label="Change Style", value="change_style"),
-                UIOption(label="Change Budget", value="change_budget"),
-                UIOption(label="Change Gemstone", value="change_gemstone"),
-                UIOption(label="Start Over", value="start_over"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
+    # Create a professional summary of all collected preferences
+    summary = "\n".join([
+        "Excellent! I've collected all your preferences. Let me confirm the details:",
+        "",
+        f"**Occasion**: {attributes.get('occasion', 'Not specified').title()}",
+        f"**Recipient**: {attributes.get('recipient', 'Not specified').title()}",
+        f"**Jewelry Type**: {attributes.get('category', 'Not specified').title()}",
+        f"**Metal**: {attributes.get('metal', 'Not specified').title()}",
+        f"**Style**: {attributes.get('style', 'Not specified').title()}",
+        f"**Budget**: ${attributes.get('budget_max', 'Not specified'):.0f}",
+        f"**Gemstone**: {attributes.get('gemstone', 'Not specified').title()}",
+        "",
+        "Please confirm if these details are correct, and I'll search our collection for the perfect match.",
+    ])
     
-    elif state == 'RECOMMENDING':
-        # User can ask for similar items or adjust filters
-        if any(word in user_message.lower() for word in ['similar', 'like', 'same', 'more']):
-            response['reply'] = "I'll search for more items with similar design characteristics. Let me find additional options for you..."
-            # Re-run recommendations with current attributes
-            products = get_recommendations(attributes)
-            if products:
-                response['products'] = products
-                response['action_buttons'] = [
-                    UIOption(label="Adjust Search Criteria", value="adjust_filter"),
-                    UIOption(label="Type your answer", value="__type__")
-                ]
-            else:
-                response['reply'] = "I couldn't find additional similar items with your current criteria. Would you like to adjust your search parameters?"
-                response['action_buttons'] = [
-                    UIOption(label="Adjust Search Criteria", value="adjust_filter"),
-                    UIOption(label="Start Over", value="start_over"),
-                    UIOption(label="Type your answer", value="__type__")
-                ]
-        elif any(word in user_message.lower() for word in ['adjust', 'change', 'different', 'filter']):
-            session['state'] = 'ADJUSTING_FILTERS'
-            response['reply'] = "Let's refine your search criteria. What would you like to modify? (occasion, recipient, category, metal, style, budget, or gemstone)"
-            response['action_buttons'] = [
-                UIOption(label="Change Occasion", value="change_occasion"),
-                UIOption(label="Change Recipient", value="change_recipient"),
-                UIOption(label="Change Category", value="change_category"),
-                UIOption(label="Change Metal", value="change_metal"),
-                UIOption(label="Change Style", value="change_style"),
-                UIOption(label="Change Budget", value="change_budget"),
-                UIOption(label="Change Gemstone", value="change_gemstone"),
-                UIOption(label="Start Over", value="start_over"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
+    response['reply'] = summary
+    response['action_buttons'] = _SUMMARY_BUTTONS
+    return response
+
+async def _handle_showing_summary(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    if _CONFIRM_RE.search(message_lc):
+        session['state'] = 'RECOMMENDING'
+        products = await get_recommendations(attributes)
+        if products:
+            response['reply'] = f"Perfect! I've found {len(products)} excellent options that match your preferences for {attributes.get('occasion', '')} {attributes.get('category', 'jewelry')} in {attributes.get('metal', '')} with {attributes.get('style', '')} style. Here are your personalized recommendations:"
+            response['products'] = products
+            # Add action buttons after recommendations
+            response['action_buttons'] = _RESULTS_BUTTONS
         else:
-            response['reply'] = "I'm here to assist you with your jewelry search. You can request similar items, adjust your search criteria, or start a new search."
-            response['action_buttons'] = [
-                UIOption(label="Show Similar Items", value="similar_design"),
-                UIOption(label="Adjust Search Criteria", value="adjust_filter"),
-                UIOption(label="Start Over", value="start_over"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-    
-    elif state == 'BROWSING':
-        # User is browsing products, can ask for more or filter
-        if any(word in user_message.lower() for word in ['more', 'show', 'browse', 'explore']):
-            response['reply'] = "I'll show you more products to browse through."
-            # Return more random products
-            if PRODUCT_CATALOG:
-                response['products'] = random.sample(PRODUCT_CATALOG, 4)
-                response['action_buttons'] = [
-                    UIOption(label="Show More", value="show_more"),
-                    UIOption(label="Filter by Category", value="filter_category"),
-                    UIOption(label="Type your answer", value="__type__")
-                ]
-            else:
-                response['reply'] = "I don't have more products to show right now. Would you like to start a new search?"
-                response['action_buttons'] = [
-                    UIOption(label="Start Over", value="start_over"),
-                    UIOption(label="Type your answer", value="__type__")
-                ]
-        elif any(word in user_message.lower() for word in ['filter', 'category', 'type']):
-            session['state'] = 'AWAITING_CATEGORY'
-            response['reply'] = "What type of jewelry would you like to browse? (e.g., rings, necklaces, earrings, pendants, bracelets, watches)"
-            response['action_buttons'] = [
-                UIOption(label="Rings", value="rings"),
-                UIOption(label="Necklaces", value="necklaces"),
-                UIOption(label="Earrings", value="earrings"),
-                UIOption(label="Pendants", value="pendants"),
-                UIOption(label="Bracelets", value="bracelets"),
-                UIOption(label="Watches", value="watches"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
+            response['reply'] = f"I've searched our collection for {attributes.get('occasion', '')} {attributes.get('category', 'jewelry')} in {attributes.get('metal', '')} with {attributes.get('style', '')} style and {attributes.get('gemstone', '')} gemstone under ${attributes.get('budget_max', 0):.0f}, but couldn't find an exact match. However, here are some excellent alternatives you might consider:"
+            response['products'] = CATALOG_INDEX.sample_featured(4)
+            response['action_buttons'] = _RESULTS_BUTTONS
+            session['state'] = 'BROWSING'
+    else:
+        session['state'] = 'ADJUSTING_FILTERS'
+        response['reply'] = "No problem! What would you like to adjust? (occasion, recipient, category, metal, style, budget, or gemstone)"
+        response['action_buttons'] = _ADJUST_BUTTONS
+    return response
+
+async def _handle_recommending(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    # User can ask for similar items or adjust filters
+    tags = _keyword_tags(_RECOMMENDING_CLASSIFIER, message_lc)
+    if 'similar' in tags:
+        response['reply'] = "I'll search for more items with similar design characteristics. Let me find additional options for you..."
+        # Re-run recommendations with current attributes
+        products = await get_recommendations(attributes)
+        if products:
+            response['products'] = products
+            response['action_buttons'] = _MORE_RESULTS_BUTTONS
         else:
-            response['reply'] = "I'm here to help you browse our jewelry collection. You can ask for more products, filter by category, or start a new search."
-            response['action_buttons'] = [
-                UIOption(label="Show More", value="show_more"),
-                UIOption(label="Filter by Category", value="filter_category"),
-                UIOption(label="Start Over", value="start_over"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-    
-    elif state == 'ADJUSTING_FILTERS':
-        # Handle filter adjustments
-        if 'occasion' in user_message.lower():
-            session['state'] = 'AWAITING_OCCASION'
-            response['reply'] = "What's the occasion for this gift? (e.g., birthday, anniversary, wedding, graduation, holiday)"
-            response['action_buttons'] = [
-                UIOption(label="Birthday", value="birthday"),
-                UIOption(label="Anniversary", value="anniversary"),
-                UIOption(label="Wedding", value="wedding"),
-                UIOption(label="Graduation", value="graduation"),
-                UIOption(label="Holiday", value="holiday"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-        elif 'recipient' in user_message.lower():
-            session['state'] = 'AWAITING_RECIPIENT'
-            response['reply'] = "Who is this gift for? (e.g., wife, husband, girlfriend, boyfriend, mother, father, friend)"
-            response['action_buttons'] = [
-                UIOption(label="Wife", value="wife"),
-                UIOption(label="Husband", value="husband"),
-                UIOption(label="Girlfriend", value="girlfriend"),
-                UIOption(label="Boyfriend", value="boyfriend"),
-                UIOption(label="Mother", value="mother"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-        elif 'category' in user_message.lower():
-            session['state'] = 'AWAITING_CATEGORY'
-            response['reply'] = "What type of jewelry are you looking for? (e.g., rings, necklaces, earrings, pendants, bracelets, watches)"
-            response['action_buttons'] = [
-                UIOption(label="Rings", value="rings"),
-                UIOption(label="Necklaces", value="necklaces"),
-                UIOption(label="Earrings", value="earrings"),
-                UIOption(label="Pendants", value="pendants"),
-                UIOption(label="Bracelets", value="bracelets"),
-                UIOption(label="Watches", value="watches"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-        elif 'metal' in user_message.lower():
-            session['state'] = 'AWAITING_METAL'
-            response['reply'] = "What metal type would you prefer? (e.g., gold, silver, platinum, rose gold, white gold)"
-            response['action_buttons'] = [
-                UIOption(label="Gold", value="gold"),
-                UIOption(label="Silver", value="silver"),
-                UIOption(label="Platinum", value="platinum"),
-                UIOption(label="Rose Gold", value="rose gold"),
-                UIOption(label="White Gold", value="white gold"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-        elif 'style' in user_message.lower():
-            session['state'] = 'AWAITING_STYLE'
-            response['reply'] = "What style are you looking for? (e.g., classic, modern, vintage, minimalist, bold, elegant)"
-            response['action_buttons'] = [
-                UIOption(label="Classic", value="classic"),
-                UIOption(label="Modern", value="modern"),
-                UIOption(label="Vintage", value="vintage"),
-                UIOption(label="Minimalist", value="minimalist"),
-                UIOption(label="Bold", value="bold"),
-                UIOption(label="Elegant", value="elegant"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-        elif 'budget' in user_message.lower():
-            session['state'] = 'AWAITING_BUDGET'
-            response['reply'] = "What's your budget range for this gift?"
-            response['action_buttons'] = [
-                UIOption(label="Under $100", value="under_100"),
-                UIOption(label="$100 - $500", value="100_500"),
-                UIOption(label="$500 - $1000", value="500_1000"),
-                UIOption(label="$1000 - $2500", value="1000_2500"),
-                UIOption(label="$2500+", value="2500_plus"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-        elif 'gemstone' in user_message.lower():
-            session['state'] = 'AWAITING_GEMSTONE'
-            response['reply'] = "Do you have a preference for gemstones? (e.g., diamond, sapphire, ruby, emerald, pearl, none)"
-            response['action_buttons'] = [
-                UIOption(label="Diamond", value="diamond"),
-                UIOption(label="Sapphire", value="sapphire"),
-                UIOption(label="Ruby", value="ruby"),
-                UIOption(label="Emerald", value="emerald"),
-                UIOption(label="Pearl", value="pearl"),
-                UIOption(label="No Gemstone", value="none"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
+            response['reply'] = "I couldn't find additional similar items with your current criteria. Would you like to adjust your search parameters?"
+            response['action_buttons'] = _NO_MORE_RESULTS_BUTTONS
+    elif 'adjust' in tags:
+        session['state'] = 'ADJUSTING_FILTERS'
+        response['reply'] = "Let's refine your search criteria. What would you like to modify? (occasion, recipient, category, metal, style, budget, or gemstone)"
+        response['action_buttons'] = _ADJUST_BUTTONS
+    else:
+        response['reply'] = "I'm here to assist you with your jewelry search. You can request similar items, adjust your search criteria, or start a new search."
+        response['action_buttons'] = _RECOMMENDING_HELP_BUTTONS
+    return response
+
+async def _handle_browsing(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    # User is browsing products, can ask for more or filter
+    tags = _keyword_tags(_BROWSING_CLASSIFIER, message_lc)
+    if 'more' in tags:
+        response['reply'] = "I'll show you more products to browse through."
+        # Next products from the pre-shuffled featured pool
+        if PRODUCT_CATALOG:
+            response['products'] = CATALOG_INDEX.sample_featured(4)
+            response['action_buttons'] = _BROWSE_BUTTONS
         else:
-            response['reply'] = "I can help you adjust: occasion, recipient, category, metal, style, budget, or gemstone. What would you like to change?"
-            response['action_buttons'] = [
-                UIOption(label="Change Occasion", value="change_occasion"),
-                UIOption(label="Change Recipient", value="change_recipient"),
-                UIOption(label="Change Category", value="change_category"),
-                UIOption(label="Change Metal", value="change_metal"),
-                UIOption(label="Change Style", value="change_style"),
-                UIOption(label="Change Budget", value="change_budget"),
-                UIOption(label="Change Gemstone", value="change_gemstone"),
-                UIOption(label="Start Over", value="start_over"),
-                UIOption(label="Type your answer", value="__type__")
-            ]
-    
+            response['reply'] = "I don't have more products to show right now. Would you like to start a new search?"
+            response['action_buttons'] = _START_OVER_BUTTONS
+    elif 'filter' in tags:
+        session['state'] = 'AWAITING_CATEGORY'
+        response['reply'] = "What type of jewelry would you like to browse? (e.g., rings, necklaces, earrings, pendants, bracelets, watches)"
+        response['action_buttons'] = _CATEGORY_BUTTONS
     else:
-        # Fallback for any unexpected state
-        response['reply'] = "I'm here to help you find the perfect jewelry! What would you like to do?"
-        response['action_buttons'] = [
-            UIOption(label="Start Over", value="start_over"),
-            UIOption(label="Browse Products", value="browse"),
-            UIOption(label="Type your answer", value="__type__")
-        ]
+        response['reply'] = "I'm here to help you browse our jewelry collection. You can ask for more products, filter by category, or start a new search."
+        response['action_buttons'] = _BROWSING_HELP_BUTTONS
+    return response
+
+async def _handle_adjusting_filters(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    # Handle filter adjustments
+    tags = _keyword_tags(_ADJUST_FIELD_CLASSIFIER, message_lc)
+    field = next((field for field in _ADJUST_DISPATCH if field in tags), None)
+    if field:
+        session['state'], response['reply'], response['action_buttons'] = _ADJUST_DISPATCH[field]
+    else:
+        response['reply'] = "I can help you adjust: occasion, recipient, category, metal, style, budget, or gemstone. What would you like to change?"
+        response['action_buttons'] = _ADJUST_BUTTONS
+    return response
+
+async def _handle_unknown_state(session: Dict, attributes: Dict, user_message: str, message_lc: str) -> Dict:
+    response = {}
+    # Fallback for any unexpected state
+    response['reply'] = "I'm here to help you find the perfect jewelry! What would you like to do?"
+    response['action_buttons'] = _FALLBACK_BUTTONS
+    return response
+
+# State -> turn handler; each handler gets the raw message and its lowercased form
+_STATE_HANDLERS = {
+    'AWAITING_NAME': _handle_awaiting_name,
+    'AWAITING_INTENT': _handle_awaiting_intent,
+    'AWAITING_OCCASION': _handle_awaiting_occasion,
+    'AWAITING_RECIPIENT': _handle_awaiting_recipient,
+    'AWAITING_CATEGORY': _handle_awaiting_category,
+    'AWAITING_METAL': _handle_awaiting_metal,
+    'AWAITING_STYLE': _handle_awaiting_style,
+    'AWAITING_BUDGET': _handle_awaiting_budget,
+    'AWAITING_GEMSTONE': _handle_awaiting_gemstone,
+    'SHOWING_SUMMARY': _handle_showing_summary,
+    'RECOMMENDING': _handle_recommending,
+    'BROWSING': _handle_browsing,
+    'ADJUSTING_FILTERS': _handle_adjusting_filters,
+}
+
+async def process_turn(session: Dict, user_message: str) -> Dict:
+    state = session.get('state', 'AWAITING_NAME')
+    attributes = session.get('attributes', {})
+
+    # Log the current state and user message for debugging
+    logging.info(f"Conversation state: {state}, User message: '{user_message}', Attributes: {attributes}")
+    
+    handler = _STATE_HANDLERS.get(state, _handle_unknown_state)
+    response = await handler(session, attributes, user_message, user_message.lower())
 
     session['attributes'] = attributes
     return response
 
 # --- API Endpoints ---
+async def run_chat_turn(session_id: str, message: str) -> Dict:
+    """Load the session, run one conversation turn and save the session back"""
+    # Concurrent turns for the same session would otherwise overwrite each other's state
+    async with session_store.session_lock(session_id):
+        session = await session_store.get_session(session_id) or {'state': 'AWAITING_NAME', 'attributes': {}}
+    
+        # Initial greeting logic
+        if not message and session['state'] == 'AWAITING_NAME':
+            response_data = {'reply': "Welcome to our store! I'm your personal shopping assistant. What's your name?"}
+        else:
+            response_data = await process_turn(session, message)
+    
+        # Ensure we always have a valid reply
+        if not response_data.get('reply'):
+            response_data['reply'] = "I'm here to help you find the perfect jewelry! How can I assist you today?"
+    
+        await session_store.set_session(session_id, session)
+    return response_data
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_handler(request: ChatRequest):
     session_id = request.session_id or str(uuid.uuid4())
-    session = SESSIONS.get(session_id, {'state': 'AWAITING_NAME', 'attributes': {}})
+    response_data = await run_chat_turn(session_id, request.message)
     
-    # Initial greeting logic
-    if not request.message and session['state'] == 'AWAITING_NAME':
-        response_data = {'reply': "Welcome to our store! I'm your personal shopping assistant. What's your name?"}
-    else:
-        response_data = process_turn(session, request.message)
-    
-    # Ensure we always have a valid reply
-    if not response_data.get('reply'):
-        response_data['reply'] = "I'm here to help you find the perfect jewelry! How can I assist you today?"
+    # Products and buttons are server-built, so skip re-validating them through ChatResponse;
+    # ChatResponse still documents the response shape
+    return ORJSONResponse({
+        "session_id": session_id,
+        "reply": response_data.get('reply'),
+        "action_buttons": dump_buttons(response_data.get('action_buttons')),
+        "products": response_data.get('products'),
+    })
+
+def _sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_handler(request: ChatRequest):
+    """Same turn as /chat, sent as server-sent events so the session id goes out before the turn runs"""
+    session_id = request.session_id or str(uuid.uuid4())
     
-    SESSIONS[session_id] = session
+    async def events():
+        yield _sse_event("session", {"session_id": session_id})
+        response_data = await run_chat_turn(session_id, request.message)
+        # Reply text first; the product list is the bulk of the payload
+        yield _sse_event("reply", {"reply": response_data['reply']})
+        if response_data.get('products'):
+            yield _sse_event("products", {"products": response_data['products']})
+        if response_data.get('action_buttons'):
+            yield _sse_event("action_buttons", {"action_buttons": dump_buttons(response_data['action_buttons'])})
+        yield _sse_event("done", {})
     
-    return ChatResponse(
-        session_id=session_id,
-        reply=response_data.get('reply'),
-        action_buttons=response_data.get('action_buttons'),
-        products=response_data.get('products')
-    )
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.post("/new-session")
 async def new_session_handler(request: NewSessionRequest):
-    if request.session_id and request.session_id in SESSIONS:
-        del SESSIONS[request.session_id]
+    if not request.session_id:
+        return {"status": "success", "message": "Session cleared"}
+    async with session_store.session_lock(request.session_id):
+        deleted = await session_store.delete_session(request.session_id)
+    if deleted:
         logging.info(f"Cleared session {request.session_id}")
     return {"status": "success", "message": "Session cleared"}
 
@@ -668,77 +871,79 @@ class ProductRequest(BaseModel):
     page: int = 1
     limit: int = 5
     category: Optional[str] = None
+    # Keyset cursor: id of the last product already shown; takes precedence over page
+    after_id: Optional[str] = None
+
+def page_bounds(request: ProductRequest, cursor_start: Optional[int]) -> Tuple[int, int]:
+    """Slice bounds for a page, seeking from the cursor when one was given"""
+    start_idx = cursor_start if request.after_id else (request.page - 1) * request.limit
+    return start_idx, start_idx + request.limit
+
+def catalog_etag(*parts) -> str:
+    """Weak ETag for a catalog listing; the same in every worker and across restarts until the catalog changes"""
+    return f'W/"{CATALOG_VERSION}-{"-".join(map(str, parts))}"'
+
+def not_modified(http_request: Request, etag: str) -> bool:
+    return http_request.headers.get("if-none-match") == etag
+
+def next_cursor(products: list, page_products: list, end_idx: int) -> Optional[str]:
+    """Cursor for the following page, or None on the last page"""
+    return page_products[-1].id if page_products and end_idx < len(products) else None
 
 @app.post("/products/new-arrivals")
-async def new_arrivals_handler(request: ProductRequest):
+async def new_arrivals_handler(request: ProductRequest, http_request: Request):
     """Get newly added products with pagination"""
     try:
-        # For demo purposes, return a subset of products
-        # In production, you'd query by creation date
-        start_idx = (request.page - 1) * request.limit
-        end_idx = start_idx + request.limit
+        # Pre-sorted newest first when the catalog index is built
+        newest = CATALOG_INDEX.newest_first
+        cursor_start = None
+        if request.after_id:
+            rank = CATALOG_INDEX.newest_rank.get(request.after_id)
+            if rank is None:
+                return {"error": "Unknown cursor"}
+            cursor_start = rank + 1
+        start_idx, end_idx = page_bounds(request, cursor_start)
         
-        # Get products from catalog
-        available_products = PRODUCT_CATALOG[start_idx:end_idx] if PRODUCT_CATALOG else []
-        total_products = len(PRODUCT_CATALOG) if PRODUCT_CATALOG else 0
-        total_pages = (total_products + request.limit - 1) // request.limit
+        # The page is fully determined by its bounds, whether reached by page number or cursor
+        etag = catalog_etag("new", start_idx, request.limit)
+        if not_modified(http_request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        return {
-            "products": available_products,
-            "total_products": total_products,
+        page_products = newest[start_idx:end_idx]
+        total_pages = (TOTAL_PRODUCTS + request.limit - 1) // request.limit
+        
+        return ORJSONResponse({
+            "products": CATALOG_INDEX.as_records(page_products),
+            "total_products": TOTAL_PRODUCTS,
             "total_pages": total_pages,
-            "current_page": request.page,
-            "limit": request.limit
-        }
+            "current_page": start_idx // request.limit + 1,
+            "limit": request.limit,
+            "next_cursor": next_cursor(newest, page_products, end_idx)
+        }, headers={"ETag": etag})
     except Exception as e:
         logging.error(f"Error fetching new arrivals: {e}")
         return {"error": "Failed to fetch new arrivals"}
 
 @app.post("/products/categories")
-async def categories_handler(request: ProductRequest):
+async def categories_handler(request: ProductRequest, http_request: Request):
     """Get jewelry categories with product counts"""
     try:
-        # Define jewelry categories
+        etag = catalog_etag("categories")
+        if not_modified(http_request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # Counts are precomputed when the catalog loads; nothing here scans the catalog
         categories = [
             {
-                "name": "Rings",
-                "description": "Engagement rings, wedding bands, and fashion rings",
-                "product_count": len([p for p in PRODUCT_CATALOG if 'ring' in p.get('category', '').lower() or 'ring' in p.get('tags', [])]),
-                "icon": "diamond"
-            },
-            {
-                "name": "Necklaces",
-                "description": "Pendants, chains, and statement necklaces",
-                "product_count": len([p for p in PRODUCT_CATALOG if 'necklace' in p.get('category', '').lower() or 'necklace' in p.get('tags', [])]),
-                "icon": "favorite"
-            },
-            {
-                "name": "Earrings",
-                "description": "Studs, hoops, and drop earrings",
-                "product_count": len([p for p in PRODUCT_CATALOG if 'earring' in p.get('category', '').lower() or 'earring' in p.get('tags', [])]),
-                "icon": "star"
-            },
-            {
-                "name": "Bracelets",
-                "description": "Charm bracelets, bangles, and tennis bracelets",
-                "product_count": len([p for p in PRODUCT_CATALOG if 'bracelet' in p.get('category', '').lower() or 'bracelet' in p.get('tags', [])]),
-                "icon": "circle"
-            },
-            {
-                "name": "Watches",
-                "description": "Luxury timepieces and smartwatches",
-                "product_count": len([p for p in PRODUCT_CATALOG if 'watch' in p.get('category', '').lower() or 'watch' in p.get('tags', [])]),
-                "icon": "schedule"
-            },
-            {
-                "name": "Pendants",
-                "description": "Charm pendants and gemstone pendants",
-                "product_count": len([p for p in PRODUCT_CATALOG if 'pendant' in p.get('category', '').lower() or 'pendant' in p.get('tags', [])]),
-                "icon": "favorite_border"
+                "name": name,
+                "description": description,
+                "product_count": CATEGORY_COUNTS.get(keyword, 0),
+                "icon": icon
             }
+            for keyword, name, description, icon in PRODUCT_CATEGORIES
         ]
         
-        return {"categories": categories}
+        return ORJSONResponse({"categories": categories}, headers={"ETag": etag})
     except Exception as e:
         logging.error(f"Error fetching categories: {e}")
         return {"error": "Failed to fetch categories"}
@@ -750,31 +955,29 @@ async def category_products_handler(request: ProductRequest):
         if not request.category:
             return {"error": "Category parameter is required"}
         
-        # Filter products by category
-        category_products = []
-        for product in PRODUCT_CATALOG:
-            category_match = (
-                request.category.lower() in product.get('category', '').lower() or
-                request.category.lower() in [tag.lower() for tag in product.get('tags', [])]
-            )
-            if category_match:
-                category_products.append(product)
+        # Storefront categories are prebuilt lists; other values fall back to a mask scan
+        category_products = CATALOG_INDEX.category_products(request.category)
         
         # Apply pagination
-        start_idx = (request.page - 1) * request.limit
-        end_idx = start_idx + request.limit
+        cursor_start = None
+        if request.after_id:
+            cursor_start = CATALOG_INDEX.seek_after(category_products, request.after_id)
+            if cursor_start is None:
+                return {"error": "Unknown cursor"}
+        start_idx, end_idx = page_bounds(request, cursor_start)
         paginated_products = category_products[start_idx:end_idx]
         
         total_products = len(category_products)
         total_pages = (total_products + request.limit - 1) // request.limit
         
         return {
-            "products": paginated_products,
+            "products": CATALOG_INDEX.as_records(paginated_products),
             "total_products": total_products,
             "total_pages": total_pages,
-            "current_page": request.page,
+            "current_page": start_idx // request.limit + 1,
             "limit": request.limit,
-            "category": request.category
+            "category": request.category,
+            "next_cursor": next_cursor(category_products, paginated_products, end_idx)
         }
     except Exception as e:
         logging.error(f"Error fetching category products: {e}")
@@ -785,11 +988,16 @@ async def category_products_handler(request: ProductRequest):
 async def analytics_track_handler(request: dict):
     """Track user interactions for analytics"""
     try:
-        # Log the analytics data
-        logging.info(f"Analytics: {request}")
-        
-        # In production, you'd store this in a database
-        # For now, just log it
+        # Queue the event; the background flusher writes it, so the request never waits on I/O.
+        # With analytics disabled there is no queue and nothing to do.
+        queue = app.state.analytics_queue
+        if queue is not None:
+            try:
+                queue.put_nowait(request)
+            except asyncio.QueueFull:
+                ANALYTICS_STATS['dropped'] += 1
+                if ANALYTICS_STATS['dropped'] % 1000 == 1:
+                    logging.warning(f"Analytics queue full; {ANALYTICS_STATS['dropped']} events dropped so far")
         
         return {"status": "success", "message": "Analytics tracked"}
     except Exception as e:
@@ -803,3 +1011,14 @@ create_staff_dashboard_routes(app) # Add dashboard routes
 @app.get("/")
 async def read_index():
     return FileResponse('static/index.html')
+
+if __name__ == "__main__":
+    import uvicorn
+    # The app is passed by import string so uvicorn can spawn workers. One by default: each worker
+    # loads its own embedding model, and without Redis sessions only live in the worker's memory
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
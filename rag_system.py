@@ -3,34 +3,206 @@ RAG (Retrieval-Augmented Generation) System
 Combines vector search with LLM for enhanced product recommendations
 """
 import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+import numpy as np
 from vector_db import get_vector_database, VectorDatabase
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The dashboard polls system stats; a Pinecone stats round-trip per poll is wasted within this window
+STATS_TTL_SECONDS = 5.0
+
 class RAGSystem:
     def __init__(self, vector_db: Optional[VectorDatabase] = None):
         self.vector_db = vector_db or get_vector_database()
         self.min_similarity_threshold = 0.4
+        # LRU of (query, preferences, top_k) -> filtered products; queries come from a small
+        # attribute vocabulary, so exact-match memoization catches nearly every repeat
+        self.result_cache_size = 1024
+        self._result_cache: OrderedDict = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        # canonical attribute term -> unit-norm embedding, filled once at startup
+        self.attr_centroids: Dict[str, np.ndarray] = {}
+        # (monotonic time computed, stats) of the last get_system_stats call
+        self._stats_cache: Tuple[float, Optional[Dict[str, Any]]] = (0.0, None)
         logger.info("RAG system initialized")
 
-    def retrieve_relevant_products(self, query: str, preferences: Dict[str, Any], top_k: int = 10) -> List[Dict[str, Any]]:
-        logger.info(f"Retrieving products for query: '{query}' with preferences: {preferences}")
-        
-        products = self.vector_db.hybrid_search(query, preferences, top_k)
-        
-        filtered_products = [
-            product for product in products
-            if product.get('similarity_score', 0) >= self.min_similarity_threshold
-        ]
-        logger.info(f"Retrieved {len(filtered_products)} relevant products")
-        return filtered_products
+    def _cache_key(self, query: Any, preferences: Dict[str, Any], top_k: int) -> Tuple:
+        return (query, tuple(sorted(preferences.items())), top_k)
+
+    def _cache_get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._result_cache_lock:
+            cached = self._result_cache.get(key)
+            if cached is None:
+                return None
+            self._result_cache.move_to_end(key)
+        # Callers annotate the returned dicts, so hand out copies
+        return [dict(product) for product in cached]
+
+    def _cache_put(self, key: Tuple, products: Tuple[Dict[str, Any], ...]):
+        """Store products as-is; they are only ever handed out as copies"""
+        with self._result_cache_lock:
+            self._result_cache[key] = products
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self.result_cache_size:
+                self._result_cache.popitem(last=False)
+
+    def _filter_by_similarity(self, products: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], ...]:
+        """Threshold freshly searched products straight into the frozen form the result cache holds"""
+        threshold = self.min_similarity_threshold
+        return tuple(product for product in products if product.get('similarity_score', 0) >= threshold)
+
+    def _retrieve_batch(self, queries: List[Any], preferences_list: List[Dict[str, Any]], top_k: int,
+                        embed: Callable[[List[Any]], List[List[float]]]) -> List[List[Dict[str, Any]]]:
+        """Serve cached results and search the rest in one batch"""
+        keys = [self._cache_key(query, preferences, top_k) for query, preferences in zip(queries, preferences_list)]
+        results = [self._cache_get(key) for key in keys]
+        # Identical queries in one batch are searched once; key -> first index seen
+        misses: Dict[Tuple, int] = {}
+        for i, cached in enumerate(results):
+            if cached is None:
+                misses.setdefault(keys[i], i)
+        if not misses:
+            return results
+
+        to_search = list(misses.values())
+        logger.info(f"Retrieving products for a batch of {len(to_search)} unique queries ({len(queries)} submitted)")
+        batch_results = self.vector_db.query_by_vectors(
+            embed([queries[i] for i in to_search]),
+            [preferences_list[i] for i in to_search], top_k
+        )
+        fresh = {}
+        for i, products in zip(to_search, batch_results):
+            fresh[keys[i]] = self._filter_by_similarity(products)
+            self._cache_put(keys[i], fresh[keys[i]])
+
+        for i, cached in enumerate(results):
+            if cached is None:
+                # Duplicates each get their own copies, as cache hits do
+                results[i] = [dict(product) for product in fresh[keys[i]]]
+        return results
+
+    def warm_attribute_centroids(self, terms: List[str]):
+        """Embed the canonical attribute vocabulary once so chat queries skip the encoder"""
+        self.attr_centroids.update(self._encode_terms([term for term in set(terms) if term not in self.attr_centroids]))
+        logger.info(f"Cached embeddings for {len(self.attr_centroids)} attribute terms")
+
+    def _encode_terms(self, terms: List[str]) -> Dict[str, np.ndarray]:
+        if not terms:
+            return {}
+        centroids = {}
+        for term, embedding in zip(terms, self.vector_db.embed_batch(terms)):
+            vector = np.asarray(embedding, dtype=np.float32)
+            centroids[term] = vector / (np.linalg.norm(vector) or 1.0)
+        return centroids
+
+    def _embed_terms(self, term_lists: List[Tuple[str, ...]]) -> List[List[float]]:
+        """Query vectors as the normalized mean of per-term centroids, encoding only non-canonical terms"""
+        # Free-text answers are embedded per batch rather than cached, so clients can't grow attr_centroids
+        extra = self._encode_terms(list({term for terms in term_lists for term in terms if term not in self.attr_centroids}))
+
+        embeddings = []
+        for terms in term_lists:
+            vector = np.mean([self.attr_centroids.get(term, extra.get(term)) for term in terms], axis=0)
+            embeddings.append((vector / (np.linalg.norm(vector) or 1.0)).tolist())
+        return embeddings
+
+    def retrieve_from_attributes_batch(self, term_lists: List[Tuple[str, ...]], preferences_list: List[Dict[str, Any]], top_k: int = 10) -> List[List[Dict[str, Any]]]:
+        return self._retrieve_batch(term_lists, preferences_list, top_k, self._embed_terms)
+
+    def get_system_stats(self) -> Dict[str, Any]:
+        """Vector index and cache statistics, recomputed at most every STATS_TTL_SECONDS"""
+        computed_at, stats = self._stats_cache
+        now = time.monotonic()
+        if stats is not None and now - computed_at < STATS_TTL_SECONDS:
+            return stats
+
+        stats = {
+            "vector_db": self.vector_db.get_collection_stats(),
+            "min_similarity_threshold": self.min_similarity_threshold,
+            "result_cache_entries": len(self._result_cache),
+            "attribute_centroids": len(self.attr_centroids),
+        }
+        self._stats_cache = (now, stats)
+        return stats
+
+    # Pinecone's client and the embedding model are blocking; run them off the event loop
+    async def aretrieve_from_attributes_batch(self, term_lists: List[Tuple[str, ...]], preferences_list: List[Dict[str, Any]], top_k: int = 10) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self.retrieve_from_attributes_batch, term_lists, preferences_list, top_k)
+
+class RAGBatcher:
+    """Coalesces retrievals from concurrent requests into a single batched RAG call"""
+
+    def __init__(self, retrieve_batch: Callable[[List[Any], List[Dict[str, Any]], int], Awaitable[List[List[Dict[str, Any]]]]],
+                 max_batch: int = 32, max_wait_ms: float = 8.0):
+        self.retrieve_batch = retrieve_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background batching task on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"RAG batcher started (max_batch={self.max_batch}, max_wait={self.max_wait * 1000:.0f}ms)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, query: Any, preferences: Dict[str, Any], top_k: int = 10) -> List[Dict[str, Any]]:
+        """Queue a retrieval and wait for its slice of the batched result"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, preferences, top_k, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Give concurrent requests a short window to join this batch
+            await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]):
+        queries = [query for query, _, _, _ in batch]
+        preferences_list = [preferences for _, preferences, _, _ in batch]
+        top_k = max(k for _, _, k, _ in batch)
+
+        try:
+            results = await self.retrieve_batch(queries, preferences_list, top_k)
+        except Exception as e:
+            logger.error(f"Batched retrieval of {len(batch)} queries failed: {e}")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, k, future), products in zip(batch, results):
+            if not future.done():
+                future.set_result(products[:k])
 
 rag_system = None
+_rag_system_lock = threading.Lock()
 def get_rag_system() -> RAGSystem:
     global rag_system
     if rag_system is None:
-        rag_system = RAGSystem()
-    return rag_system
\ No newline at end of file
+        # Startup builds this in a worker thread while requests may already ask for it
+        with _rag_system_lock:
+            if rag_system is None:
+                rag_system = RAGSystem()
+    return rag_system
@@ -11,17 +11,17 @@ def seed():
     
     db_manager = get_database_manager()
     db = next(db_manager.get_db())
-    products_from_db = db_manager.get_all_products(db)
-    db.close()
+    try:
+        # Plain column rows; no ORM instances or _sa_instance_state to strip
+        product_rows = db_manager.get_all_product_rows(db)
+    finally:
+        db.close()
 
-    if not products_from_db:
+    if not product_rows:
         logging.error("No products found in PostgreSQL. Cannot seed vector DB.")
         return
 
-    PRODUCT_CATALOG = []
-    for product in products_from_db:
-        product_dict = {k: v for k, v in product.__dict__.items() if not k.startswith('_')}
-        PRODUCT_CATALOG.append(product_dict)
+    PRODUCT_CATALOG = [dict(row) for row in product_rows]
 
     logging.info(f"Loaded {len(PRODUCT_CATALOG)} products from PostgreSQL.")
     
@@ -1,15 +1,29 @@
 """
 Staff Dashboard for Retail AI Assistant - Serves the dashboard HTML and its API endpoints.
 """
+import time
+import asyncio
 import logging
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from analytics import get_analytics_engine, MetricPeriod
-from datetime import datetime, timedelta
+from rag_system import get_rag_system
+from datetime import datetime, timezone
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# (epoch seconds, ISO string) of the last formatted timestamp; health polling reuses it within a second
+_timestamp_cache = (0.0, "")
+
+def now_iso() -> str:
+    """Current UTC time as ISO 8601, formatted at most once per second"""
+    global _timestamp_cache
+    now = time.time()
+    if now - _timestamp_cache[0] >= 1.0:
+        _timestamp_cache = (now, datetime.fromtimestamp(now, tz=timezone.utc).isoformat())
+    return _timestamp_cache[1]
+
 def create_staff_dashboard_routes(app: FastAPI):
     """Create staff dashboard routes"""
     
@@ -24,8 +38,8 @@ def create_staff_dashboard_routes(app: FastAPI):
         try:
             analytics_engine = get_analytics_engine()
             
-            # Get analytics data for the last 24 hours
-            dashboard_data = analytics_engine.get_comprehensive_dashboard_data(MetricPeriod.LAST_DAY)
+            # Get analytics data for the last 24 hours; the queries are blocking, so run them off the event loop
+            dashboard_data = await asyncio.to_thread(analytics_engine.get_comprehensive_dashboard_data, MetricPeriod.LAST_DAY)
             
             if "error" in dashboard_data:
                 logger.error(f"Error getting dashboard data: {dashboard_data['error']}")
@@ -59,7 +73,7 @@ def create_staff_dashboard_routes(app: FastAPI):
             }
             
             logger.info(f"Successfully fetched dashboard data: {transformed_data['conversation_metrics']['total_sessions']} sessions")
-            return JSONResponse(content=transformed_data)
+            return ORJSONResponse(content=transformed_data)
             
         except Exception as e:
             logger.error(f"Error in get_dashboard_data: {e}")
@@ -83,13 +97,13 @@ def create_staff_dashboard_routes(app: FastAPI):
                 raise HTTPException(status_code=400, detail="Invalid period. Use: last_hour, last_day, last_week, last_month")
             
             metric_period = period_map[period]
-            dashboard_data = analytics_engine.get_comprehensive_dashboard_data(metric_period)
+            dashboard_data = await asyncio.to_thread(analytics_engine.get_comprehensive_dashboard_data, metric_period)
             
             if "error" in dashboard_data:
                 logger.error(f"Error getting analytics for period {period}: {dashboard_data['error']}")
                 raise HTTPException(status_code=500, detail="Failed to fetch analytics data")
             
-            return JSONResponse(content=dashboard_data)
+            return ORJSONResponse(content=dashboard_data)
             
         except HTTPException:
             raise
@@ -102,12 +116,12 @@ def create_staff_dashboard_routes(app: FastAPI):
         """Get detailed information about a specific conversation session."""
         try:
             analytics_engine = get_analytics_engine()
-            session_data = analytics_engine.get_session_details(session_id)
+            session_data = await asyncio.to_thread(analytics_engine.get_session_details, session_id)
             
             if "error" in session_data:
                 raise HTTPException(status_code=404, detail=session_data["error"])
             
-            return JSONResponse(content=session_data)
+            return ORJSONResponse(content=session_data)
             
         except HTTPException:
             raise
@@ -115,6 +129,16 @@ def create_staff_dashboard_routes(app: FastAPI):
             logger.error(f"Error in get_session_details: {e}")
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+    @app.get("/staff/api/rag-stats")
+    async def get_rag_stats():
+        """Vector index and RAG cache statistics; cached for a few seconds by the RAG system."""
+        try:
+            stats = await asyncio.to_thread(get_rag_system().get_system_stats)
+            return ORJSONResponse(content=stats)
+        except Exception as e:
+            logger.error(f"Error in get_rag_stats: {e}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
     @app.get("/staff/api/health")
     async def dashboard_health_check():
         """Health check endpoint for the dashboard."""
@@ -122,11 +146,11 @@ def create_staff_dashboard_routes(app: FastAPI):
             analytics_engine = get_analytics_engine()
             
             # Test basic analytics functionality
-            test_metrics = analytics_engine.get_conversation_metrics(MetricPeriod.LAST_DAY)
+            test_metrics = await asyncio.to_thread(analytics_engine.get_conversation_metrics, MetricPeriod.LAST_DAY)
             
-            return JSONResponse(content={
+            return ORJSONResponse(content={
                 "status": "healthy",
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": now_iso(),
                 "analytics_engine": "operational",
                 "test_metrics": {
                     "total_sessions": test_metrics.total_sessions,
@@ -136,10 +160,10 @@ def create_staff_dashboard_routes(app: FastAPI):
             
         except Exception as e:
             logger.error(f"Dashboard health check failed: {e}")
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "status": "unhealthy",
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": now_iso(),
                     "error": str(e)
                 },
                 status_code=500
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar catalog index
+Runs against the shipped product_catalog_large.json
+"""
+
+import sys
+import os
+import json
+import random
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_index import CatalogIndex, CatalogProduct, calculate_match_score
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "product_catalog_large.json")
+
+def load_catalog_index() -> CatalogIndex:
+    """Index the shipped catalog the way startup does; the JSON has no created_at column"""
+    with open(CATALOG_PATH, "r") as f:
+        rows = json.load(f)
+    return CatalogIndex([CatalogProduct.from_row(dict(row, created_at=row.get("created_at"))) for row in rows])
+
+def test_has_tag_finds_occasions_and_recipients():
+    """RAG is only attempted for occasions/recipients the catalog is tagged with"""
+    index = load_catalog_index()
+    for occasion in ("wedding", "birthday", "anniversary"):
+        assert index.has_tag("occasion", occasion), occasion
+    for recipient in ("wife", "girlfriend", "friend"):
+        assert index.has_tag("recipient", recipient), recipient
+    # Each attribute only looks in its own tag list
+    assert not index.has_tag("occasion", "wife")
+    assert not index.has_tag("recipient", "graduation")
+
+def test_match_scores_agree_with_calculate_match_score():
+    """The vectorized kernel must score exactly like the per-dict reference"""
+    index = load_catalog_index()
+    choices = {
+        "category": ("ring", "necklace", "earrings", "watch"),
+        "metal": ("gold", "silver", "rose gold", "titanium"),
+        "occasion": ("wedding", "birthday", "anniversary", "date night"),
+        "recipient": ("wife", "girlfriend", "best friend", "mother"),
+    }
+    rng = random.Random(7)
+    everything = np.arange(index.size)
+    for _ in range(50):
+        attributes = {field: rng.choice(values) for field, values in choices.items() if rng.random() < 0.8}
+        expected = [calculate_match_score(record, attributes) for record in index.records]
+        assert np.allclose(index.match_scores(everything, attributes), expected), attributes
+
+def test_occasion_and_recipient_raise_scores():
+    """Matching occasion/recipient tags must add to a product's score, never only dilute it"""
+    index = load_catalog_index()
+    row = index.id_index["RIN0001"]  # occasion_tags: gift, formal; recipient_tags: parent, girlfriend, myself
+    base = {"category": "ring", "metal": "gold"}
+    without_tags = index.match_scores(np.array([row]), base)[0]
+    with_tags = index.match_scores(np.array([row]), dict(base, occasion="formal", recipient="girlfriend"))[0]
+    assert with_tags > without_tags
+
+def test_tag_mask_and_category_counts():
+    index = load_catalog_index()
+    assert not index.tag_mask("watch").any()
+    assert index.tag_mask("ring").sum() == len(index.tag_postings["ring"])
+    counts = index.category_counts(("ring", "necklace", "earring", "bracelet", "watch", "pendant"))
+    # 'ring' is also a substring of the 'earrings' category
+    assert counts == {"ring": 251, "necklace": 125, "earring": 126, "bracelet": 124, "watch": 0, "pendant": 0}, counts
+    assert index.category_products("watch") == []
+
+def test_seek_after():
+    index = load_catalog_index()
+    members = index.category_products("necklace")
+    assert index.seek_after(members, members[9].id) == 10
+    assert index.seek_after(members, members[-1].id) == len(members)
+    assert index.seek_after(members, "NO-SUCH-ID") is None
+    # A cursor that isn't a member still lands between the members around its catalog row
+    outsider = next(p for p in index.products if p.category != "necklace" and index.id_index[p.id] > index.id_index[members[0].id])
+    offset = index.seek_after(members, outsider.id)
+    assert all(index.id_index[p.id] < index.id_index[outsider.id] for p in members[:offset])
+    assert all(index.id_index[p.id] > index.id_index[outsider.id] for p in members[offset:])
+
+def test_parse_budget():
+    # The chat flow lives in main, which needs the full application environment
+    from main import parse_budget
+    cases = {
+        "2500_plus": 10000.0,
+        "under_100": 100.0,
+        "under 300": 300.0,
+        "$1,500": 1500.0,
+        "over 300": 10000.0,
+        "2500+": 10000.0,
+        "don't want to go over 300": 300.0,
+        "not more than 500": 500.0,
+        "nothing over 300": 300.0,
+        "none above 750": 750.0,
+        "around 2k": 2000.0,
+        "2.5k": 2500.0,
+        "3k+": 10000.0,
+        "i discovered 200 is fine": 200.0,
+        "under": 100.0,
+        "no idea": 1000.0,
+    }
+    for message, expected in cases.items():
+        assert parse_budget(message) == expected, (message, parse_budget(message))
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Tests for the product listing and chat API: keyset cursors, ETags,
+recommendation coalescing and the SSE chat stream
+Runs against the shipped product_catalog_large.json; needs the full application environment
+"""
+
+import sys
+import os
+import asyncio
+import orjson
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_index import CatalogIndex
+from test_catalog_index import load_catalog_index
+
+def load_app():
+    """main with the shipped catalog installed the way startup installs it, and a test client.
+    Startup itself doesn't run, so nothing connects to Redis, Postgres or Pinecone"""
+    import main
+    from fastapi.testclient import TestClient
+    index = load_catalog_index()
+    index.index_categories(main.CATEGORY_KEYWORDS)
+    main.PRODUCT_CATALOG = index.products
+    main.TOTAL_PRODUCTS = index.size
+    main.CATALOG_INDEX = index
+    main.CATALOG_VERSION = index.version
+    main.CATEGORY_COUNTS = index.category_counts(main.CATEGORY_KEYWORDS)
+    return main, TestClient(main.app)
+
+def test_new_arrivals_cursor_walk():
+    main, client = load_app()
+    seen = []
+    cursor = None
+    while True:
+        body = client.post("/products/new-arrivals", json={"limit": 40, "after_id": cursor}).json()
+        seen.extend(product["id"] for product in body["products"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+        assert cursor == seen[-1]
+    # Cursor pages cover the newest-first order exactly once, and the last page has no cursor
+    assert seen == [product.id for product in main.CATALOG_INDEX.newest_first]
+    # A cursor resumes right after its product, wherever the page boundary was
+    after = main.CATALOG_INDEX.newest_first[16].id
+    body = client.post("/products/new-arrivals", json={"limit": 3, "after_id": after}).json()
+    assert [product["id"] for product in body["products"]] == seen[17:20]
+    assert main.CATALOG_INDEX.newest_rank[after] == 16
+
+def test_unknown_cursors():
+    _, client = load_app()
+    assert client.post("/products/new-arrivals", json={"after_id": "NO-SUCH-ID"}).json() == {"error": "Unknown cursor"}
+    body = client.post("/products/category", json={"category": "necklace", "after_id": "NO-SUCH-ID"}).json()
+    assert body == {"error": "Unknown cursor"}
+
+def test_category_cursor_walk():
+    main, client = load_app()
+    members = main.CATALOG_INDEX.category_products("necklace")
+    seen = []
+    cursor = None
+    while True:
+        body = client.post("/products/category", json={"category": "necklace", "limit": 30, "after_id": cursor}).json()
+        seen.extend(product["id"] for product in body["products"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [product.id for product in members]
+    # A product from another category still works as a cursor: the page starts after its catalog row
+    id_index = main.CATALOG_INDEX.id_index
+    outsider = next(p for p in main.CATALOG_INDEX.products
+                    if p.category != "necklace" and id_index[p.id] > id_index[members[10].id])
+    body = client.post("/products/category", json={"category": "necklace", "limit": 5, "after_id": outsider.id}).json()
+    assert body["products"]
+    assert all(id_index[product["id"]] > id_index[outsider.id] for product in body["products"])
+    assert body["products"][0]["id"] == next(p.id for p in members if id_index[p.id] > id_index[outsider.id])
+
+def test_etags():
+    main, client = load_app()
+    first = client.post("/products/new-arrivals", json={"page": 2, "limit": 10})
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"') and main.CATALOG_VERSION in etag
+    repeat = client.post("/products/new-arrivals", json={"page": 2, "limit": 10}, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.headers["etag"] == etag and not repeat.content
+    # The same page reached through a cursor is the same representation
+    cursor = client.post("/products/new-arrivals", json={"page": 1, "limit": 10}).json()["next_cursor"]
+    assert client.post("/products/new-arrivals", json={"limit": 10, "after_id": cursor}).headers["etag"] == etag
+    assert client.post("/products/new-arrivals", json={"page": 3, "limit": 10}).headers["etag"] != etag
+
+    categories = client.post("/products/categories", json={})
+    assert client.post("/products/categories", json={}, headers={"If-None-Match": categories.headers["etag"]}).status_code == 304
+
+    # Reloading a different catalog changes every ETag, so clients refetch
+    main.CATALOG_VERSION = CatalogIndex(load_catalog_index().products[:-1]).version
+    changed = client.post("/products/new-arrivals", json={"page": 2, "limit": 10}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert client.post("/products/categories", json={}).headers["etag"] != categories.headers["etag"]
+
+def test_recommendations_coalesce():
+    main, _ = load_app()
+    calls = []
+
+    async def load(attributes, cache_attributes, local_key):
+        calls.append(local_key)
+        await asyncio.sleep(0.05)
+        return [{"id": "RIN0001"}]
+
+    async def run():
+        main.LOCAL_RECOMMENDATIONS.clear()
+        attributes = {"occasion": "wedding", "recipient": "wife", "budget_max": 500.0}
+        return await asyncio.gather(*(main.get_recommendations(dict(attributes)) for _ in range(5)))
+
+    original = main._load_recommendations
+    main._load_recommendations = load
+    try:
+        results = asyncio.run(run())
+    finally:
+        main._load_recommendations = original
+    assert len(calls) == 1
+    assert results == [[{"id": "RIN0001"}]] * 5
+    assert not main.RECOMMENDATIONS_IN_FLIGHT
+
+def test_recommendation_errors_reach_every_waiter():
+    main, _ = load_app()
+    calls = []
+
+    async def load(attributes, cache_attributes, local_key):
+        calls.append(local_key)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("vector index down")
+
+    async def run():
+        main.LOCAL_RECOMMENDATIONS.clear()
+        attributes = {"occasion": "birthday", "recipient": "friend", "budget_max": 300.0}
+        return await asyncio.gather(*(main.get_recommendations(dict(attributes)) for _ in range(3)), return_exceptions=True)
+
+    original = main._load_recommendations
+    main._load_recommendations = load
+    try:
+        results = asyncio.run(run())
+    finally:
+        main._load_recommendations = original
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "vector index down" for result in results)
+    # The failure isn't cached: the next request computes again
+    assert not main.RECOMMENDATIONS_IN_FLIGHT
+    assert not main.LOCAL_RECOMMENDATIONS
+
+def read_events(response):
+    """(event, data) pairs of a server-sent event stream"""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event[len("event: "):], orjson.loads(data[len("data: "):])))
+    return events
+
+def test_chat_stream():
+    _, client = load_app()
+    response = client.post("/chat/stream", json={"message": ""})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_events(response)
+    # The session id goes out before the turn runs, and the stream always ends with done
+    assert [event for event, _ in events] == ["session", "reply", "done"]
+    session_id = events[0][1]["session_id"]
+    assert "What's your name?" in events[1][1]["reply"]
+
+    events = read_events(client.post("/chat/stream", json={"session_id": session_id, "message": "Alice"}))
+    assert [event for event, _ in events] == ["session", "reply", "action_buttons", "done"]
+    assert events[0][1] == {"session_id": session_id}
+    assert "Alice" in events[1][1]["reply"]
+    assert all(set(button) == {"label", "value"} for button in events[2][1]["action_buttons"])
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
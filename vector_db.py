@@ -1,6 +1,7 @@
 # /vector_db.py (CORRECTED to use Pinecone Client)
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone
@@ -18,7 +19,13 @@ except Exception as e:
     embedding_model = None
 # --------------------------------------------------------------------
 
-PRODUCT_CATALOG = []
+# Documents embedded per encoder call when indexing, and vectors per Pinecone upsert request
+ENCODE_CHUNK_SIZE = 500
+UPSERT_BATCH_SIZE = 100
+# Upsert requests kept in flight while seeding
+UPSERT_CONCURRENCY = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "8"))
+# Pinecone queries of one batch that may be in flight at once
+QUERY_CONCURRENCY = int(os.getenv("PINECONE_QUERY_CONCURRENCY", "8"))
 
 class VectorDatabase:
     def __init__(self):
@@ -26,6 +33,7 @@ class VectorDatabase:
             raise RuntimeError("Embedding model could not be loaded.")
 
         self.embedding_model = embedding_model
+        self._query_pool = ThreadPoolExecutor(max_workers=QUERY_CONCURRENCY, thread_name_prefix="pinecone-query")
         self.api_key = os.getenv("PINECONE_API_KEY")
         self.index_name = "joxy-retail"
         
@@ -53,36 +61,73 @@ class VectorDatabase:
             return
 
         logger.info(f"Adding {len(products)} products to Pinecone...")
-        vectors_to_upsert = []
-        for product in products:
-            if not product.get('id'): continue
-            
-            doc_text = f"Product: {product.get('name', '')}. Description: {product.get('description', '')}. Tags: {' '.join(product.get('tags', []))}"
-            embedding = self.embedding_model.encode(doc_text).tolist()
-            
-            metadata = {key: value for key, value in product.items() if isinstance(value, (str, int, float, bool))}
-            vectors_to_upsert.append({'id': product['id'], 'values': embedding, 'metadata': metadata})
-
-        batch_size = 100
-        for i in range(0, len(vectors_to_upsert), batch_size):
-            batch = vectors_to_upsert[i:i + batch_size]
-            self.index.upsert(vectors=batch)
-            logger.info(f"Upserted batch {i//batch_size + 1}")
-        
-        logger.info(f"Successfully added {len(vectors_to_upsert)} products.")
+        added = self.upsert_bulk(products)
+        logger.info(f"Successfully added {added} products.")
 
-    def hybrid_search(self, query: str, preferences: Dict[str, Any], top_k: int = 15) -> List[Dict[str, Any]]:
-        if not self.index: return []
-            
+    def upsert_bulk(self, products: List[Dict[str, Any]], max_workers: int = UPSERT_CONCURRENCY) -> int:
+        """Embeds and upserts products, keeping upsert requests in flight while the next chunk encodes"""
+        if not self.index: return 0
+
+        products = [product for product in products if product.get('id')]
+        added = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pinecone-upsert") as pool:
+            pending = []
+            # Encode a chunk of documents per model call, then upsert it in request-sized batches
+            for start in range(0, len(products), ENCODE_CHUNK_SIZE):
+                chunk = products[start:start + ENCODE_CHUNK_SIZE]
+                doc_texts = [
+                    f"Product: {product.get('name', '')}. Description: {product.get('description', '')}. Tags: {' '.join(product.get('tags') or [])}"
+                    for product in chunk
+                ]
+                embeddings = self.embedding_model.encode(doc_texts, batch_size=64).tolist()
+                vectors_to_upsert = [
+                    {
+                        'id': product['id'],
+                        'values': embedding,
+                        'metadata': {key: value for key, value in product.items() if isinstance(value, (str, int, float, bool))},
+                    }
+                    for product, embedding in zip(chunk, embeddings)
+                ]
+                for i in range(0, len(vectors_to_upsert), UPSERT_BATCH_SIZE):
+                    pending.append(pool.submit(self.index.upsert, vectors=vectors_to_upsert[i:i + UPSERT_BATCH_SIZE]))
+                added += len(vectors_to_upsert)
+                logger.info(f"Encoded {added}/{len(products)} products")
+
+            # Surface the first failed request, if any
+            for future in pending:
+                future.result()
+        return added
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Vector count and shape of the Pinecone index (one describe_index_stats round-trip)"""
+        if not self.index: return {"status": "unavailable"}
+
+        stats = self.index.describe_index_stats()
+        return {
+            "status": "available",
+            "index_name": self.index_name,
+            "total_vector_count": stats.get('total_vector_count', 0),
+            "dimension": stats.get('dimension'),
+            "index_fullness": stats.get('index_fullness'),
+        }
+
+    def _build_filters(self, preferences: Dict[str, Any]) -> Dict[str, Any]:
         filters = {}
         if preferences.get('category'): filters['category'] = preferences['category']
         if preferences.get('metal'): filters['metal'] = preferences['metal']
         if preferences.get('budget_max'): filters['price'] = {"$lte": float(preferences['budget_max'])}
-        
-        query_embedding = self.embedding_model.encode(query).tolist()
-        
+        return filters
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # One forward pass for every text instead of one encode() call per query.
+        return self.embedding_model.encode(texts).tolist()
+
+    def query_by_vector(self, embedding: List[float], preferences: Dict[str, Any], top_k: int = 15) -> List[Dict[str, Any]]:
+        if not self.index: return []
+
+        filters = self._build_filters(preferences)
         results = self.index.query(
-            vector=query_embedding, top_k=top_k,
+            vector=embedding, top_k=top_k,
             filter=filters if filters else None,
             include_metadata=True
         )
@@ -96,6 +141,17 @@ class VectorDatabase:
                 products.append(product_data)
         return products
 
+    def hybrid_search(self, query: str, preferences: Dict[str, Any], top_k: int = 15) -> List[Dict[str, Any]]:
+        if not self.index: return []
+        return self.query_by_vector(self.embed_batch([query])[0], preferences, top_k)
+
+    def query_by_vectors(self, embeddings: List[List[float]], preferences_list: List[Dict[str, Any]], top_k: int = 15) -> List[List[Dict[str, Any]]]:
+        if not self.index: return [[] for _ in embeddings]
+        if len(embeddings) == 1:
+            return [self.query_by_vector(embeddings[0], preferences_list[0], top_k)]
+        # Each query is a blocking network round-trip; overlap them instead of paying for them in turn
+        return list(self._query_pool.map(self.query_by_vector, embeddings, preferences_list, [top_k] * len(embeddings)))
+
 vector_db = None
 def get_vector_database() -> VectorDatabase:
     global vector_db
@@ -104,9 +160,7 @@ def get_vector_database() -> VectorDatabase:
     return vector_db
 
 def initialize_vector_database_with_products(products: List[Dict[str, Any]]) -> VectorDatabase:
-    global PRODUCT_CATALOG
-    PRODUCT_CATALOG = products
     vdb = get_vector_database()
     if vdb and vdb.index:
-        vdb.add_products(PRODUCT_CATALOG)
+        vdb.add_products(products)
     return vdb